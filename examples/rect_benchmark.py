@@ -0,0 +1,53 @@
+import sys
+import time
+
+import numpy
+
+import pxng
+from pxng.keys import KEY_Q
+
+# Usage: python rect_benchmark.py [instanced] [rect count] [frame count]
+#
+# Draws the same random rectangles every frame through *fill_rects* and prints
+# the average frame time. Run it with and without 'instanced' to compare the
+# instanced renderer with the default vertex expanding one.
+
+
+def update(window: pxng.Window):
+    if window.key_state(KEY_Q).pressed:
+        window.close_window()
+
+    rects = window.context['rects']
+    colors = window.context['colors']
+    window.fill_rects(rects, colors)
+
+    window.context['frame'] += 1
+    if window.context['frame'] == window.context['frame_count']:
+        elapsed = time.perf_counter() - window.context['start']
+        frame_time = elapsed / window.context['frame_count'] * 1000
+        mode = 'instanced' if window.context['instanced'] else 'vertex'
+        print(f'{mode}: {len(rects)} rects, {frame_time:.2f} ms/frame')
+        window.close_window()
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    instanced = 'instanced' in args
+    numbers = [int(arg) for arg in args if arg.isdigit()]
+    count = numbers[0] if len(numbers) > 0 else 40000
+    frame_count = numbers[1] if len(numbers) > 1 else 300
+
+    window = pxng.Window(640, 480, 'Rect Benchmark', scale=2, instanced_rects=instanced)
+
+    rng = numpy.random.default_rng(0)
+    xy = rng.uniform(0, (320, 240), size=(count, 2))
+    wh = rng.uniform(1, 8, size=(count, 2))
+    window.context['rects'] = numpy.hstack((xy, wh))
+    window.context['colors'] = rng.uniform(0, 1, size=(count, 3))
+    window.context['instanced'] = instanced
+    window.context['frame'] = 0
+    window.context['frame_count'] = frame_count
+    window.context['start'] = time.perf_counter()
+
+    window.set_update_handler(update)
+    window.start_event_loop()
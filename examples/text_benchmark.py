@@ -0,0 +1,85 @@
+import sys
+import time
+
+import numpy
+
+import pxng
+from pxng.keys import KEY_Q
+
+# Usage: python text_benchmark.py [geometry|instanced] [glyph count ...] [--frames N]
+#
+# Draws the same random strings every frame and prints the average frame time
+# for every combination of text backend and glyph count. Without arguments the
+# geometry shader and the instanced quad backends are compared at 10000 and
+# 100000 glyphs. The first frames compile shaders and upload the font atlas,
+# they are not measured.
+
+STRING_LENGTH = 10
+WARMUP_FRAMES = 10
+
+
+def update(window: pxng.Window):
+    if window.key_state(KEY_Q).pressed:
+        window.close_window()
+
+    context = window.context
+    for x, y, text in context['strings']:
+        window.draw_text(x, y, text)
+
+    context['frame'] += 1
+    if context['frame'] == WARMUP_FRAMES:
+        context['start'] = time.perf_counter()
+    elif context['frame'] == WARMUP_FRAMES + context['frame_count']:
+        context['elapsed'] = time.perf_counter() - context['start']
+        window.close_window()
+
+
+def make_strings(count):
+    rng = numpy.random.default_rng(0)
+    letters = numpy.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'))
+    string_count = max(count // STRING_LENGTH, 1)
+    positions = rng.uniform(0, (320, 240), size=(string_count, 2))
+    strings = [''.join(rng.choice(letters, STRING_LENGTH)) for _ in range(string_count)]
+    return [(x, y, text) for (x, y), text in zip(positions, strings)]
+
+
+def run(backend, count, frame_count):
+    window = pxng.Window(640, 480, 'Text Benchmark', scale=2, text_backend=backend)
+    window.context['strings'] = make_strings(count)
+    window.context['frame'] = 0
+    window.context['frame_count'] = frame_count
+    window.context['elapsed'] = None
+
+    window.set_update_handler(update)
+    window.start_event_loop()
+
+    elapsed = window.context['elapsed']
+    if elapsed is None:
+        # closed before the measurement finished
+        return None
+    return elapsed / frame_count * 1000
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    frame_count = 100
+    if '--frames' in args:
+        index = args.index('--frames')
+        frame_count = int(args[index + 1])
+        del args[index:index + 2]
+
+    backends = [name for name in ('geometry', 'instanced') if name in args] or ['geometry', 'instanced']
+    counts = [int(arg) for arg in args if arg.isdigit()] or [10000, 100000]
+
+    results = []
+    for count in counts:
+        for backend in backends:
+            frame_time = run(backend, count, frame_count)
+            if frame_time is None:
+                sys.exit(1)
+            results.append((backend, count, frame_time))
+
+    print()
+    print(f'{"backend":<10} {"glyphs":>8} {"ms/frame":>9}')
+    for backend, count, frame_time in results:
+        print(f'{backend:<10} {count:>8} {frame_time:>9.2f}')
@@ -1,13 +1,21 @@
-from ._utils import resource
+from ._utils import resource, set_cache_dir
 from . import colors
 from .spaces import Spaces
 from .font import Font
 from .sprite import Sprite
+from .sprite_batch import SpriteBatch
 from .animated_sprite import AnimatedSprite
+from .texture_atlas import TextureAtlas, AtlasSprite
+from .canvas import Canvas
 from .text_renderer import TextRenderer
+from .text import Text
 from .shader import ShaderProgram, ShaderType
 from .buffer_object import BufferObject
+from .matrix_block import MatrixBlock
+from .pixel_buffer import PixelBuffer
 from .vertex_array_object import VertexArrayObject
+from .scheduler import FrameScheduler
+from .frame_timings import FrameTimings
 from .window import Window
 
 
@@ -1,4 +1,103 @@
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import numpy
+
+_cache_dir = None
+
+
 def resource(resource):
-    from pathlib import Path
     font_path = Path(__file__).parent / 'resources' / resource
     return str(font_path)
+
+
+def set_cache_dir(path):
+    """
+    Enable the on-disk caches (shader binaries, font atlases) in *path*.
+    The *PXNG_CACHE_DIR* environment variable does the same. Use None to
+    fall back to the environment variable.
+    """
+    global _cache_dir
+    _cache_dir = path
+
+
+def cache_dir(name) -> Optional[Path]:
+    """Returns the cache directory for *name* or None if caching is disabled."""
+    root = _cache_dir or os.environ.get('PXNG_CACHE_DIR')
+    if not root:
+        return None
+    path = Path(root) / name
+    try:
+        path.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        # not writable -> run without the cache
+        return None
+    return path
+
+
+def write_cache_file(path: Path, data: bytes) -> bool:
+    """
+    Atomically replace the cache file *path* with *data*.
+
+    The data is written to a uniquely named temporary file first, so
+    processes sharing the cache directory never read or replace a partially
+    written file. Returns False if the file could not be written.
+    """
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix='.tmp')
+    except OSError:
+        return False
+
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, str(path))
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def colors_array(colors, count, default):
+    """
+    Normalize colors to a float32 array of shape (count, 4).
+
+    *colors* can be None (use *default*), a single RGB(A) color or an array of
+    shape (count, 3) or (count, 4). Missing alpha values are set to 1.
+    """
+    if colors is None:
+        colors = default
+    colors = numpy.asarray(colors, dtype=numpy.float32)
+    if colors.ndim == 1:
+        colors = numpy.broadcast_to(colors, (count, colors.shape[0]))
+
+    if colors.shape[1] == 3:
+        alpha = numpy.ones((colors.shape[0], 1), dtype=numpy.float32)
+        colors = numpy.hstack((colors, alpha))
+    elif colors.shape[1] != 4:
+        raise UserWarning(f'Colors must be RGB or RGBA, got shape: {colors.shape}')
+    return colors
+
+
+def color_bytes(colors, count, default):
+    """Like *colors_array* but packed as uint8 RGBA values."""
+    colors = colors_array(colors, count, default)
+    return (numpy.clip(colors, 0, 1) * 255 + 0.5).astype(numpy.uint8)
+
+
+def as_rgba(data) -> numpy.ndarray:
+    """Convert 1, 3 or 4 component uint8 image data to RGBA."""
+    data = numpy.asarray(data, dtype=numpy.uint8)
+    if data.ndim == 2:
+        data = data[:, :, numpy.newaxis]
+
+    rgba = numpy.zeros(data.shape[:2] + (4,), dtype=numpy.uint8)
+    rgba[:, :, 3] = 255
+    # a single channel sprite is a red texture: (r, 0, 0, 1) when sampled
+    rgba[:, :, :data.shape[2]] = data
+    return rgba
@@ -17,6 +17,14 @@ class AnimatedSprite:
         self._sw = self._sprite.width // self._grid_width
         self._sh = self._sprite.height // self._grid_height
 
+    @property
+    def sprite(self):
+        return self._sprite
+
+    @sprite.setter
+    def sprite(self, sprite):
+        self._sprite = sprite
+
     def _create_frames(self, w, h):
         return [(i % w, i // w) for i in range(w * h)]
 
@@ -56,14 +64,19 @@ class AnimatedSprite:
         if item['current_frame'] >= item['frame_count']:
             item['current_frame'] = 0
 
-    def draw(self, spaces: pxng.Spaces):
+    def _current_rect(self):
         animation = self._current_animation
         current_frame = animation['current_frame']
         x, y = animation['frames'][current_frame]
 
         w = self._sw
         h = self._sh
+        return x * w, y * h, w, h
+
+    def draw(self, spaces: pxng.Spaces):
+        self._sprite.draw_partial(spaces, *self._current_rect())
 
-        self._sprite.draw_partial(spaces, x * w, y * h, w, h)
+    def draw_batched(self, batch: pxng.SpriteBatch, spaces: pxng.Spaces):
+        self._sprite.draw_partial_batched(batch, spaces, *self._current_rect())
 
 
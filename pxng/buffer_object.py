@@ -1,17 +1,25 @@
-import glm
+import numpy
 from OpenGL.GL import (GL_ARRAY_BUFFER, glGenBuffers, glBindBuffer, glBufferData,
-                       GL_DYNAMIC_DRAW, glEnableVertexAttribArray, GL_UNSIGNED_INT,
-                       GL_UNSIGNED_SHORT, GL_UNSIGNED_BYTE, GL_FLOAT,
-                       glVertexAttribPointer, GL_ELEMENT_ARRAY_BUFFER, GL_DOUBLE)
+                       glBufferSubData, GL_DYNAMIC_DRAW, glEnableVertexAttribArray,
+                       GL_UNSIGNED_INT, GL_UNSIGNED_SHORT, GL_UNSIGNED_BYTE, GL_FLOAT,
+                       glVertexAttribPointer, glVertexAttribIPointer, GL_ELEMENT_ARRAY_BUFFER,
+                       GL_DOUBLE, glVertexAttribDivisor, glDeleteBuffers)
+
+from pxng.render_stats import counters
 
 
 class BufferObject:
-    def __init__(self, data_type, array_type=GL_ARRAY_BUFFER, max_size=10000):
+    def __init__(self, data_type, array_type=GL_ARRAY_BUFFER, max_size=10000,
+                 divisor=0, normalized=False):
         self._data_type = data_type
         self._array_type = array_type
-        self._arr = glm.array(data_type()) * max_size
+        self._divisor = divisor
+        self._normalized = normalized
+        template = numpy.asarray(data_type())
+        self._arr = numpy.zeros((max_size, template.size), dtype=template.dtype)
         self._index = 0
         self._vbo = glGenBuffers(1)
+        self._gpu_size = 0
         self._changed = True
 
     @property
@@ -35,21 +43,65 @@ class BufferObject:
 
     @property
     def component_count(self):
-        return len(self._data_type())
+        return self._arr.shape[1]
 
     @property
     def bytes_per_element(self):
-        return self._arr.dt_size * self.component_count
+        return self._arr.itemsize * self.component_count
+
+    @property
+    def data(self) -> numpy.ndarray:
+        """The used part of the buffer as an (n, component_count) array."""
+        return self._arr[:self._index]
+
+    def reserve(self, count):
+        """Make sure there is room for *count* more elements."""
+        required = self._index + count
+        capacity = self._arr.shape[0]
+        if required > capacity:
+            capacity = max(required, capacity * 2)
+            arr = numpy.zeros((capacity, self.component_count), dtype=self.dtype)
+            arr[:self._index] = self._arr[:self._index]
+            self._arr = arr
 
     def set_value(self, value):
+        if self._index >= self._arr.shape[0]:
+            self.reserve(1)
         self._arr[self._index] = value
         self._index += 1
         self._changed = True
 
+    def extend(self, values):
+        """
+        Append a block of elements with a single copy.
+
+        Parameters
+        ----------
+        values: array_like
+            Anything that can be reshaped to (n, component_count).
+
+        Returns
+        -------
+        int
+            The index of the first appended element.
+        """
+        values = numpy.asarray(values).reshape(-1, self.component_count)
+        count = values.shape[0]
+        start = self._index
+        self.reserve(count)
+        self._arr[start:start + count] = values
+        self._index += count
+        self._changed = True
+        return start
+
     def reset(self):
         self._index = 0
         self._changed = True
 
+    def delete(self):
+        glDeleteBuffers(1, [self._vbo])
+        self._gpu_size = 0
+
     def bind(self, attrib_index):
         if self._index == 0:
             return False
@@ -57,9 +109,14 @@ class BufferObject:
         glBindBuffer(self._array_type, self._vbo)
 
         if self._changed:
-            data = self._arr
-            size = data.itemsize * self._index
-            glBufferData(self._array_type, size, data.ptr, GL_DYNAMIC_DRAW)
+            data = self._arr[:self._index]
+            size = data.nbytes
+            if size <= self._gpu_size:
+                glBufferSubData(self._array_type, 0, size, data)
+            else:
+                glBufferData(self._array_type, size, data, GL_DYNAMIC_DRAW)
+                self._gpu_size = size
+            counters.bytes_uploaded += size
             self._changed = False
 
             if self._array_type == GL_ARRAY_BUFFER:
@@ -81,6 +138,13 @@ class BufferObject:
                 else:
                     raise UserWarning(f'Unknown data type: {dtype}')
 
-                glVertexAttribPointer(attrib_index, count, gl_type, False, stride, None)
+                normalized = self._normalized
+                if dtype.kind == 'u' and not normalized:
+                    # integer shader inputs, glVertexAttribPointer would convert them to float
+                    glVertexAttribIPointer(attrib_index, count, gl_type, stride, None)
+                else:
+                    glVertexAttribPointer(attrib_index, count, gl_type, normalized, stride, None)
+                if self._divisor:
+                    glVertexAttribDivisor(attrib_index, self._divisor)
 
         return True
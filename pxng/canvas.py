@@ -0,0 +1,129 @@
+import numpy
+
+import pxng
+from pxng._utils import as_rgba, color_bytes
+from pxng.colors import WHITE
+
+
+class Canvas(pxng.Sprite):
+    def __init__(self, width, height):
+        """
+        An RGBA pixel surface with vectorized drawing primitives.
+
+        All primitives write into a NumPy array of shape (height, width, 4)
+        and mark the touched region dirty. The changes are uploaded once per
+        frame through pixel buffers when the canvas is drawn. Colors are RGB(A)
+        floats in the range [0, 1] like everywhere else in pxng.
+
+        Parameters
+        ----------
+        width: int
+            Width of the canvas in pixels.
+        height: int
+            Height of the canvas in pixels.
+        """
+        data = numpy.zeros((height, width, 4), dtype=numpy.uint8)
+        super().__init__(data, streaming=True)
+
+    def clear(self, color=(0, 0, 0, 0)):
+        self._data[:] = color_bytes(color, 1, WHITE)[0]
+        self.update()
+
+    def plot(self, xs, ys, colors=WHITE):
+        """
+        Set pixels. Points outside of the canvas are ignored.
+
+        Parameters
+        ----------
+        xs: array_like
+            x coordinates
+        ys: array_like
+            y coordinates
+        colors: array_like
+            A single color or one color per point
+        """
+        xs = numpy.asarray(xs, dtype=numpy.intp).ravel()
+        ys = numpy.asarray(ys, dtype=numpy.intp).ravel()
+        count = max(len(xs), len(ys))
+        xs = numpy.broadcast_to(xs, (count,))
+        ys = numpy.broadcast_to(ys, (count,))
+        colors = color_bytes(colors, count, WHITE)
+
+        inside = (xs >= 0) & (xs < self._width) & (ys >= 0) & (ys < self._height)
+        if not inside.all():
+            xs = xs[inside]
+            ys = ys[inside]
+            colors = colors[inside]
+        self.set_pixels(xs, ys, colors)
+
+    def line(self, x0, y0, x1, y1, colors=WHITE):
+        """
+        Draw one or many lines. The coordinates can be scalars or arrays
+        with one entry per line.
+        """
+        coordinates = [numpy.atleast_1d(numpy.asarray(v, dtype=numpy.float64))
+                       for v in (x0, y0, x1, y1)]
+        x0, y0, x1, y1 = numpy.broadcast_arrays(*coordinates)
+        dx = x1 - x0
+        dy = y1 - y0
+        steps = numpy.maximum(numpy.abs(dx), numpy.abs(dy)).round().astype(numpy.intp) + 1
+
+        line_index = numpy.repeat(numpy.arange(len(steps)), steps)
+        first = numpy.cumsum(steps) - steps
+        step = numpy.arange(line_index.size) - first[line_index]
+        t = step / numpy.maximum(steps - 1, 1)[line_index]
+
+        xs = numpy.round(x0[line_index] + t * dx[line_index])
+        ys = numpy.round(y0[line_index] + t * dy[line_index])
+
+        colors = color_bytes(colors, len(steps), WHITE)
+        self.plot(xs, ys, colors[line_index])
+
+    def circle(self, x, y, radius, colors=WHITE):
+        """Draw the outline of a circle."""
+        octant = numpy.arange(int(numpy.ceil(radius / numpy.sqrt(2))) + 1)
+        other = numpy.round(numpy.sqrt(numpy.maximum(radius * radius - octant * octant, 0)))
+        u = numpy.concatenate((octant, other))
+        v = numpy.concatenate((other, octant))
+        xs = numpy.concatenate((u, u, -u, -u)) + x
+        ys = numpy.concatenate((v, -v, v, -v)) + y
+        self.plot(numpy.round(xs), numpy.round(ys), colors)
+
+    def fill_circle(self, x, y, radius, colors=WHITE):
+        """Draw a filled circle."""
+        r = int(numpy.ceil(radius))
+        oy, ox = numpy.mgrid[-r:r + 1, -r:r + 1]
+        inside = ox * ox + oy * oy <= radius * radius
+        xs = numpy.round(x) + ox[inside]
+        ys = numpy.round(y) + oy[inside]
+        self.plot(xs, ys, colors)
+
+    def blit(self, sprite, x, y):
+        """
+        Alpha blend a sprite (or an image array) onto the canvas with its
+        upper left corner at (x, y).
+        """
+        if isinstance(sprite, numpy.ndarray):
+            source = as_rgba(sprite)
+        else:
+            source = as_rgba(sprite.data)
+
+        x = int(x)
+        y = int(y)
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + source.shape[1], self._width)
+        y1 = min(y + source.shape[0], self._height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        source = source[y0 - y:y1 - y, x0 - x:x1 - x].astype(numpy.float32) / 255
+        target = self._data[y0:y1, x0:x1]
+        destination = target.astype(numpy.float32) / 255
+
+        alpha = source[:, :, 3:4]
+        blended = numpy.empty_like(source)
+        blended[:, :, :3] = source[:, :, :3] * alpha + destination[:, :, :3] * (1 - alpha)
+        blended[:, :, 3:] = alpha + destination[:, :, 3:4] * (1 - alpha)
+        target[:] = (blended * 255 + 0.5).astype(numpy.uint8)
+        self.update_region(x0, y0, x1 - x0, y1 - y0)
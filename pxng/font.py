@@ -1,19 +1,93 @@
+import hashlib
+import io
+import json
+from collections import OrderedDict
+from typing import List, Tuple
+
 import freetype as ft
 import numpy
 from numpy.core.multiarray import ndarray
 
+from pxng._utils import cache_dir, write_cache_file
+
 
 # This code is derived from the example in the *freetype-py* repository
 # FreeType high-level python API - Copyright 2011-2015 Nicolas P. Rougier
 
 
+_LOAD_FLAGS = ft.FT_LOAD_RENDER | ft.FT_LOAD_FORCE_AUTOHINT
+
+
 class Font:
-    def __init__(self, filename, size):
+    # printable ASCII characters are always present in the first rows of the atlas
+    first_ascii = 32
+    fallback_char = '?'
+    # bump when the atlas layout changes to invalidate cached atlases
+    cache_version = 1
+    # distance fields are computed from glyphs rendered this much larger than the atlas cells
+    sdf_oversample = 4
+    # distances are clamped to this many atlas texels
+    sdf_spread = 4
+
+    def __init__(self, filename, size, max_pages=4, page_rows=16, sdf=False, sdf_resolution=4):
+        """
+        A monospaced bitmap font.
+
+        The printable ASCII range is rasterized up front. Every other glyph is
+        rasterized on first use into atlas pages of *grid_width* x *page_rows*
+        cells below the ASCII block. Pages are added when needed until
+        *max_pages* is reached, after that the least recently used glyph is
+        replaced.
+
+        When a cache directory is set (see *pxng.set_cache_dir*) the ASCII
+        atlas and the glyph metrics are stored on disk, keyed by the hash of
+        the font file and the size, and memory mapped on later runs.
+
+        With *sdf* the atlas stores signed distance fields instead of
+        coverage. Glyphs then stay sharp at any scale and rotation, so a
+        single atlas serves all text sizes.
+
+        Parameters
+        ----------
+        filename: str
+            Path to a monospaced font file.
+        size: int
+            Font size in points.
+        max_pages: int
+            Maximum number of dynamic glyph pages.
+        page_rows: int
+            Number of glyph rows in a dynamic page.
+        sdf: bool
+            Build a signed distance field atlas.
+        sdf_resolution: int
+            Atlas texels per font pixel in a distance field atlas.
+        """
         self._font_data: ndarray = None
         self._glyph_width = None
         self._glyph_height = None
+        self._ascender = None
         self._grid_width = 16
         self._grid_height = 6
+        self._max_pages = max_pages
+        self._page_rows = page_rows
+        self._page_count = 0
+        self._sdf = sdf
+        self._sdf_resolution = sdf_resolution if sdf else 1
+        self._render_scale = self._sdf_resolution * self.sdf_oversample if sdf else 1
+
+        self._filename = filename
+        self._size = size
+        self._face = None
+        self._from_cache = False
+        self._slots = OrderedDict()  # code point -> slot, least recently used first
+        self._free_slots = []
+        self._protected = set()
+        self._dirty_regions = []
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
         self._make_font(filename, size)
 
     @property
@@ -32,39 +106,331 @@ class Font:
     def grid_height(self):
         return self._grid_height
 
+    @property
+    def sdf(self) -> bool:
+        return self._sdf
+
+    @property
+    def cell_width(self):
+        """Width of a glyph cell in the atlas. Larger than *glyph_width* for distance fields."""
+        return self._glyph_width * self._sdf_resolution
+
+    @property
+    def cell_height(self):
+        """Height of a glyph cell in the atlas."""
+        return self._glyph_height * self._sdf_resolution
+
     @property
     def data(self) -> ndarray:
+        """The atlas. A new array is created when a glyph page is added."""
         return self._font_data
 
+    @property
+    def from_cache(self) -> bool:
+        """True if the ASCII atlas was loaded from the on-disk cache."""
+        return self._from_cache
+
+    @property
+    def page_count(self):
+        """Number of dynamic glyph pages in the atlas."""
+        return self._page_count
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def evictions(self):
+        """Number of glyphs replaced so far. Glyph slots looked up before a change are stale."""
+        return self._evictions
+
+    def take_dirty_regions(self) -> List[Tuple[int, int, int, int]]:
+        """Returns and clears the atlas regions (x, y, width, height) changed since the last call."""
+        regions = self._dirty_regions
+        self._dirty_regions = []
+        return regions
+
+    def release_glyphs(self):
+        """Allow the glyphs looked up since the last call to be evicted again."""
+        self._protected.clear()
+
+    def glyph_slots(self, codes: ndarray) -> ndarray:
+        """
+        Map code points to atlas slots, rasterizing glyphs that are missing.
+
+        A slot is the cell index in the atlas counted row by row. Glyphs
+        returned here are protected from eviction until *release_glyphs* is
+        called, so a batch can not overwrite its own glyphs.
+
+        Parameters
+        ----------
+        codes: ndarray
+            uint32 code points
+
+        Returns
+        -------
+        ndarray
+            uint32 slots
+        """
+        first = self.first_ascii
+        slots = codes - numpy.uint32(first)  # wraps around for codes below the ASCII range
+        ascii_count = self._grid_width * self._grid_height
+        other = slots >= ascii_count
+        if not other.any():
+            self._hits += len(codes)
+            return slots
+
+        self._hits += len(codes) - int(numpy.count_nonzero(other))
+        for index in numpy.flatnonzero(other):
+            slots[index] = self._glyph_slot(int(codes[index]))
+        return slots
+
+    def _glyph_slot(self, code):
+        if code < self.first_ascii:
+            return self._fallback_slot()
+
+        slot = self._slots.get(code)
+        if slot is not None:
+            self._slots.move_to_end(code)
+            self._protected.add(slot)
+            self._hits += 1
+            return slot
+
+        self._misses += 1
+        if self._get_face().get_char_index(code) == 0:
+            return self._fallback_slot()
+
+        slot = self._allocate_slot()
+        if slot is None:
+            return self._fallback_slot()
+
+        self._rasterize(code, slot)
+        self._slots[code] = slot
+        self._protected.add(slot)
+        return slot
+
+    def _fallback_slot(self):
+        return ord(self.fallback_char) - self.first_ascii
+
+    def _allocate_slot(self):
+        if not self._free_slots and self._page_count < self._max_pages:
+            self._add_page()
+
+        if self._free_slots:
+            return self._free_slots.pop()
+
+        for code, slot in self._slots.items():
+            if slot not in self._protected:
+                del self._slots[code]
+                self._evictions += 1
+                return slot
+        return None
+
+    def _add_page(self):
+        grid_width = self._grid_width
+        page_slots = grid_width * self._page_rows
+        first_slot = grid_width * self._grid_height + self._page_count * page_slots
+
+        page = numpy.zeros((self._page_rows * self.cell_height, self._font_data.shape[1]),
+                           dtype=self._font_data.dtype)
+        self._font_data = numpy.vstack((self._font_data, page))
+        self._page_count += 1
+        # reversed so the slots are handed out in order
+        self._free_slots.extend(range(first_slot + page_slots - 1, first_slot - 1, -1))
+
+    def _rasterize(self, code, slot):
+        width = self.cell_width
+        height = self.cell_height
+        x0 = (slot % self._grid_width) * width
+        y0 = (slot // self._grid_width) * height
+
+        face = self._get_face()
+        face.load_char(chr(code), _LOAD_FLAGS)
+        glyph = self._bitmap_array(face.glyph.bitmap)
+        cell = self._place(glyph, face.glyph.bitmap_left, face.glyph.bitmap_top)
+        self._font_data[y0:y0 + height, x0:x0 + width] = self._atlas_cell(cell)
+
+        self._dirty_regions.append((x0, y0, width, height))
+
+    @staticmethod
+    def _bitmap_array(bitmap) -> ndarray:
+        glyph = numpy.array(bitmap.buffer, dtype=numpy.ubyte)
+        return glyph.reshape(bitmap.rows, bitmap.width)
+
+    def _place(self, glyph: ndarray, left, top) -> ndarray:
+        """Position a rendered glyph on the baseline of an empty cell at render resolution."""
+        width = self._glyph_width * self._render_scale
+        height = self._glyph_height * self._render_scale
+        cell = numpy.zeros((height, width), dtype=numpy.ubyte)
+
+        # glyphs that do not fit the cell of the font are clipped
+        x = left
+        y = self._ascender - top
+        gx0, gy0 = max(-x, 0), max(-y, 0)
+        cx0, cy0 = max(x, 0), max(y, 0)
+        w = min(glyph.shape[1] - gx0, width - cx0)
+        h = min(glyph.shape[0] - gy0, height - cy0)
+        if w > 0 and h > 0:
+            cell[cy0:cy0 + h, cx0:cx0 + w] = glyph[gy0:gy0 + h, gx0:gx0 + w]
+        return cell
+
+    def _atlas_cell(self, cell: ndarray) -> ndarray:
+        if self._sdf:
+            return self._distance_field(cell)
+        return cell
+
+    def _distance_field(self, cell: ndarray) -> ndarray:
+        """
+        Convert a high resolution glyph cell to a signed distance field.
+
+        Every atlas texel stores the distance from its center to the closest
+        glyph edge, 0.5 (128) being the edge itself, larger values inside.
+        The distance is clamped to *sdf_spread* texels.
+        """
+        factor = self.sdf_oversample
+        inside = cell >= 128
+        rows, columns = inside.shape
+
+        padded = numpy.pad(inside, 1, constant_values=False)
+        all_inside = padded[:-2, 1:-1] & padded[2:, 1:-1] & padded[1:-1, :-2] & padded[1:-1, 2:]
+        any_inside = padded[:-2, 1:-1] | padded[2:, 1:-1] | padded[1:-1, :-2] | padded[1:-1, 2:]
+        inner_edge = numpy.argwhere(inside & ~all_inside).astype(numpy.float32)
+        outer_edge = numpy.argwhere(~inside & any_inside).astype(numpy.float32)
+
+        out_rows = rows // factor
+        out_columns = columns // factor
+        coverage = inside.reshape(out_rows, factor, out_columns, factor).mean(axis=(1, 3))
+        sample_inside = (coverage >= 0.5).ravel()
+
+        ys, xs = numpy.mgrid[0:out_rows, 0:out_columns].astype(numpy.float32)
+        samples = numpy.stack((ys.ravel(), xs.ravel()), axis=1) * factor + (factor - 1) / 2
+
+        spread = self.sdf_spread * factor
+        distance = numpy.full(len(samples), spread, dtype=numpy.float32)
+        for mask, edge in ((sample_inside, outer_edge), (~sample_inside, inner_edge)):
+            if len(edge) == 0 or not mask.any():
+                continue
+            delta = samples[mask][:, numpy.newaxis, :] - edge[numpy.newaxis, :, :]
+            nearest = numpy.sqrt((delta * delta).sum(axis=2).min(axis=1))
+            distance[mask] = numpy.minimum(nearest - 0.5, spread)
+
+        signed = numpy.where(sample_inside, distance, -distance)
+        field = numpy.clip(0.5 + signed / (2 * spread), 0, 1)
+        return (field * 255 + 0.5).astype(numpy.ubyte).reshape(out_rows, out_columns)
+
+    def _get_face(self) -> ft.Face:
+        # a cached atlas does not need freetype until a non-ASCII glyph is used
+        if self._face is None:
+            self._face = ft.Face(self._filename)
+            self._face.set_char_size(self._size * self._render_scale * 64)
+        return self._face
+
+    def _cache_paths(self):
+        directory = cache_dir('fonts')
+        if directory is None:
+            return None
+
+        digest = hashlib.sha256()
+        with open(self._filename, 'rb') as fh:
+            digest.update(fh.read())
+        key = f'{self._size}:{self._grid_width}x{self._grid_height}:{self.cache_version}'
+        if self._sdf:
+            key += f':sdf:{self._sdf_resolution}:{self.sdf_oversample}:{self.sdf_spread}'
+        digest.update(key.encode('utf-8'))
+        name = digest.hexdigest()
+        return directory / f'{name}.npy', directory / f'{name}.json'
+
+    def _load_cached(self, paths):
+        if paths is None:
+            return False
+
+        atlas_path, metrics_path = paths
+        if not atlas_path.exists() or not metrics_path.exists():
+            return False
+
+        try:
+            with open(metrics_path, 'r') as fh:
+                metrics = json.load(fh)
+            glyph_width = int(metrics['glyph_width'])
+            glyph_height = int(metrics['glyph_height'])
+            ascender = int(metrics['ascender'])
+            data = numpy.load(str(atlas_path), mmap_mode='r')
+        except (OSError, ValueError, KeyError, TypeError):
+            # unreadable, partially written or from another version -> rasterize again
+            return False
+
+        resolution = self._sdf_resolution
+        expected_shape = (glyph_height * resolution * self._grid_height,
+                          glyph_width * resolution * self._grid_width)
+        if data.shape != expected_shape:
+            return False
+
+        self._font_data = data
+        self._glyph_width = glyph_width
+        self._glyph_height = glyph_height
+        self._ascender = ascender
+        return True
+
+    def _store_cached(self, paths):
+        atlas_path, metrics_path = paths
+        metrics = {
+            'glyph_width': self._glyph_width,
+            'glyph_height': self._glyph_height,
+            'ascender': self._ascender,
+        }
+
+        atlas = io.BytesIO()
+        numpy.save(atlas, self._font_data)
+        # a failed write only means the next run rasterizes again
+        if write_cache_file(atlas_path, atlas.getvalue()):
+            write_cache_file(metrics_path, json.dumps(metrics).encode('utf-8'))
+
     def _make_font(self, filename, size):
-        face = ft.Face(filename)
-        face.set_char_size(size * 64)
+        paths = self._cache_paths()
+        self._from_cache = self._load_cached(paths)
+        if self._from_cache:
+            return
+
+        face = self._get_face()
         if not face.is_fixed_width:
             raise UserWarning('Font is not monotype')
 
         grid_height = self.grid_height
         grid_width = self.grid_width
-        # Determine largest glyph size
-        width, height, ascender, descender = 0, 0, 0, 0
+        scale = self._render_scale
+
+        # Render every glyph once and keep the bitmaps to determine the largest glyph size
+        glyphs = []
+        width, ascender, descender = 0, 0, 0
         # start at 32 to skip 32 first ASCII characters
         for c in range(32, grid_width * grid_height + 32):
-            face.load_char(chr(c), ft.FT_LOAD_RENDER | ft.FT_LOAD_FORCE_AUTOHINT)
+            face.load_char(chr(c), _LOAD_FLAGS)
             bitmap = face.glyph.bitmap
+            glyphs.append((self._bitmap_array(bitmap), face.glyph.bitmap_left, face.glyph.bitmap_top))
             width = max(width, bitmap.width)
             ascender = max(ascender, face.glyph.bitmap_top)
             descender = max(descender, bitmap.rows - face.glyph.bitmap_top)
         height = ascender + descender
 
+        # glyph sizes are in font pixels, the rendering may be done at a higher resolution
+        self._glyph_width = -(-width // scale)
+        self._glyph_height = -(-height // scale)
+        self._ascender = ascender
+
         # Generate texture data
-        z = numpy.zeros((height * grid_height, width * grid_width), dtype=numpy.ubyte)
-        for j in range(grid_height):
-            for i in range(grid_width):
-                pos = chr(32 + j * grid_width + i)
-                face.load_char(pos, ft.FT_LOAD_RENDER | ft.FT_LOAD_FORCE_AUTOHINT)
-                bitmap = face.glyph.bitmap
-                x = i * width + face.glyph.bitmap_left
-                y = j * height + ascender - face.glyph.bitmap_top
-                z[y:y + bitmap.rows, x:x + bitmap.width].flat = bitmap.buffer
+        cell_width = self.cell_width
+        cell_height = self.cell_height
+        z = numpy.zeros((cell_height * grid_height, cell_width * grid_width), dtype=numpy.ubyte)
+        for index, (glyph, left, top) in enumerate(glyphs):
+            j, i = divmod(index, grid_width)
+            x = i * cell_width
+            y = j * cell_height
+            z[y:y + cell_height, x:x + cell_width] = self._atlas_cell(self._place(glyph, left, top))
         self._font_data = z
-        self._glyph_width = width
-        self._glyph_height = height
+
+        if paths is not None:
+            self._store_cached(paths)
@@ -0,0 +1,162 @@
+import csv
+import json
+import time
+from typing import Dict
+
+import numpy
+
+
+class FrameTimings:
+    phases = ('input', 'update', 'flush', 'swap', 'events')
+    percentiles = (50, 95, 99)
+
+    def __init__(self, capacity=600):
+        """
+        CPU time of the phases of the last *capacity* frames in a ring buffer.
+
+        Every frame is a row with one column per phase and a *frame* column
+        with the sum of the phases. Time that is skipped, like sleeping for
+        frame pacing, is not included. More columns,
+        like GPU times, can be added with *add_columns*. All times are in
+        seconds.
+
+        Parameters
+        ----------
+        capacity: int
+            Number of frames to keep.
+        """
+        self._columns = list(self.phases) + ['frame']
+        self._column_index = {name: index for index, name in enumerate(self._columns)}
+        self._data = numpy.zeros((capacity, len(self._columns)), dtype=numpy.float64)
+        self._capacity = capacity
+        self._index = 0
+        self._count = 0
+        self._frame_number = 0
+        self._last = 0.0
+
+    @property
+    def columns(self):
+        return tuple(self._columns)
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def frame_number(self):
+        """Number of the current frame, counting all frames since the start."""
+        return self._frame_number
+
+    def __len__(self):
+        return self._count
+
+    def add_columns(self, names):
+        """Add columns that are filled with *record*. Existing frames get zeros."""
+        names = [name for name in names if name not in self._column_index]
+        for name in names:
+            self._column_index[name] = len(self._columns)
+            self._columns.append(name)
+        if names:
+            extra = numpy.zeros((self._capacity, len(names)), dtype=self._data.dtype)
+            self._data = numpy.hstack((self._data, extra))
+
+    def record(self, frame_number, values: Dict[str, float]):
+        """
+        Store *values* in the columns of an earlier frame, e.g. results that
+        arrive some frames late. Frames that left the ring are ignored.
+        """
+        if frame_number > self._frame_number or self._frame_number - frame_number >= self._capacity:
+            return
+        row = frame_number % self._capacity
+        for name, value in values.items():
+            self._data[row, self._column_index[name]] = value
+
+    def begin_frame(self):
+        self._data[self._index] = 0
+        self._last = time.perf_counter()
+
+    def mark(self, phase):
+        """Attribute the time since the previous mark to *phase*."""
+        now = time.perf_counter()
+        self._data[self._index, self._column_index[phase]] += now - self._last
+        self._last = now
+
+    def skip(self):
+        """Do not attribute the time since the previous mark to any phase."""
+        self._last = time.perf_counter()
+
+    def end_frame(self):
+        row = self._data[self._index]
+        row[self._column_index['frame']] = sum(row[self._column_index[phase]] for phase in self.phases)
+        self._index = (self._index + 1) % self._capacity
+        self._count = min(self._count + 1, self._capacity)
+        self._frame_number += 1
+
+    def frames(self) -> numpy.ndarray:
+        """The recorded frames, oldest first, as an (n, len(columns)) array."""
+        if self._count < self._capacity:
+            return self._data[:self._count].copy()
+        return numpy.roll(self._data, -self._index, axis=0)
+
+    def column_index(self, name) -> int:
+        return self._column_index[name]
+
+    def column(self, name) -> numpy.ndarray:
+        """The times of one phase (or 'frame') for the recorded frames, oldest first."""
+        return self.frames()[:, self._column_index[name]]
+
+    def last(self, name='frame') -> float:
+        """The time of *name* in the last completed frame."""
+        if self._count == 0:
+            return 0.0
+        return float(self._data[(self._index - 1) % self._capacity, self._column_index[name]])
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns
+        -------
+        dict
+            For every column the p50, p95 and p99 percentiles, the mean and
+            the maximum in milliseconds.
+        """
+        frames = self.frames() * 1000
+        result = {}
+        for index, name in enumerate(self._columns):
+            values = frames[:, index]
+            if len(values) == 0:
+                values = numpy.zeros(1)
+            stats = {f'p{q}': float(v) for q, v in zip(self.percentiles,
+                                                        numpy.percentile(values, self.percentiles))}
+            stats['mean'] = float(values.mean())
+            stats['max'] = float(values.max())
+            result[name] = stats
+        return result
+
+    def to_csv(self, path):
+        """Write the percentile summary in milliseconds, one row per column."""
+        summary = self.summary()
+        fields = [f'p{q}' for q in self.percentiles] + ['mean', 'max']
+        with open(path, 'w', newline='') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(['phase'] + [f'{field}_ms' for field in fields])
+            for name, stats in summary.items():
+                writer.writerow([name] + [f'{stats[field]:.4f}' for field in fields])
+
+    def to_json(self, path, samples=False):
+        """
+        Write the percentile summary in milliseconds as JSON.
+
+        Parameters
+        ----------
+        path: str
+            File to write.
+        samples: bool
+            Also write the time of every recorded frame per column.
+        """
+        document = {'frames': self._count, 'unit': 'ms', 'summary': self.summary()}
+        if samples:
+            frames = self.frames() * 1000
+            document['samples'] = {name: frames[:, index].round(4).tolist()
+                                   for index, name in enumerate(self._columns)}
+        with open(path, 'w') as fh:
+            json.dump(document, fh, indent=2)
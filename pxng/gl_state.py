@@ -0,0 +1,85 @@
+import OpenGL.GL as gl
+
+from pxng.render_stats import counters
+
+
+class GLState:
+    def __init__(self):
+        """
+        Remembers the bound program, vertex array, textures, enabled
+        capabilities and blend function, and skips calls that would not
+        change any of them. All of pxng binds through the shared *state*
+        instance, so the tracked state matches the context.
+        """
+        self.issued = 0
+        self.skipped = 0
+        self._program = None
+        self._vertex_array = None
+        self._textures = {}
+        self._capabilities = {}
+        self._blend_func = None
+
+    def invalidate(self):
+        """Forget everything, e.g. after a new context or a deleted object."""
+        self._program = None
+        self._vertex_array = None
+        self._textures = {}
+        self._capabilities = {}
+        self._blend_func = None
+
+    def reset_counters(self):
+        self.issued = 0
+        self.skipped = 0
+
+    def use_program(self, program_id):
+        if program_id == self._program:
+            self.skipped += 1
+            return
+        gl.glUseProgram(program_id)
+        self._program = program_id
+        self.issued += 1
+        counters.program_switches += 1
+
+    def bind_vertex_array(self, vertex_array):
+        if vertex_array == self._vertex_array:
+            self.skipped += 1
+            return
+        gl.glBindVertexArray(vertex_array)
+        self._vertex_array = vertex_array
+        self.issued += 1
+
+    def bind_texture(self, target, texture):
+        if self._textures.get(target) == texture:
+            self.skipped += 1
+            return
+        gl.glBindTexture(target, texture)
+        self._textures[target] = texture
+        self.issued += 1
+        counters.texture_binds += 1
+
+    def enable(self, capability):
+        if self._capabilities.get(capability) is True:
+            self.skipped += 1
+            return
+        gl.glEnable(capability)
+        self._capabilities[capability] = True
+        self.issued += 1
+
+    def disable(self, capability):
+        if self._capabilities.get(capability) is False:
+            self.skipped += 1
+            return
+        gl.glDisable(capability)
+        self._capabilities[capability] = False
+        self.issued += 1
+
+    def blend_func(self, source, destination):
+        if self._blend_func == (source, destination):
+            self.skipped += 1
+            return
+        gl.glBlendFunc(source, destination)
+        self._blend_func = (source, destination)
+        self.issued += 1
+
+
+state = GLState()
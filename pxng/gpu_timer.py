@@ -0,0 +1,140 @@
+import ctypes
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import OpenGL.GL as gl
+
+
+class GpuTimer:
+    categories = ('quad', 'sprite', 'text', 'grid')
+
+    def __init__(self, latency=3):
+        """
+        Measures the GPU time of pxng draw calls per category with
+        GL_TIME_ELAPSED queries.
+
+        Results are read back at least *latency* frames later, and only when
+        the driver reports them as available, so measuring does not wait for
+        the GPU. Only a frame that is still not done after four times the
+        latency is read with a blocking call. Query objects are reused from a
+        pool. The timer does nothing until it is enabled. All of pxng
+        measures through the shared *timer* instance.
+
+        Parameters
+        ----------
+        latency: int
+            Number of frames to wait before reading the results of a frame.
+        """
+        self._enabled = False
+        self._latency = latency
+        self._free: List[int] = []
+        self._frame: List[Tuple[str, int]] = []
+        self._pending = deque()
+        self._active: Optional[str] = None
+        self._depth = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, enabled):
+        if self._enabled and not enabled:
+            # drop the queries of the unfinished and the pending frames, their
+            # results would otherwise be reported after timing is enabled again
+            if self._depth > 0:
+                gl.glEndQuery(gl.GL_TIME_ELAPSED)
+                self._depth = 0
+                self._active = None
+            self._free.extend(query for _, query in self._frame)
+            self._frame = []
+            for _, queries in self._pending:
+                self._free.extend(query for _, query in queries)
+            self._pending.clear()
+        self._enabled = enabled
+
+    def begin(self, category):
+        """Start timing *category*. Nested calls are counted toward the outer category."""
+        if not self.enabled:
+            return
+        self._depth += 1
+        if self._depth > 1:
+            # time elapsed queries can not be nested
+            return
+
+        if not self._free:
+            self._free.extend(int(query) for query in gl.glGenQueries(16))
+        query = self._free.pop()
+        gl.glBeginQuery(gl.GL_TIME_ELAPSED, query)
+        self._frame.append((category, query))
+        self._active = category
+
+    def end(self):
+        if not self.enabled or self._depth == 0:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            gl.glEndQuery(gl.GL_TIME_ELAPSED)
+            self._active = None
+
+    def end_frame(self, frame_id) -> List[Tuple[object, Dict[str, float]]]:
+        """
+        Close the queries of the current frame and collect finished frames.
+
+        Parameters
+        ----------
+        frame_id
+            Identifies the current frame in the returned results.
+
+        Returns
+        -------
+        list of (frame_id, dict)
+            The GPU seconds per category of every frame that became
+            available, oldest first.
+        """
+        if not self.enabled:
+            return []
+
+        self._pending.append((frame_id, self._frame))
+        self._frame = []
+
+        results = []
+        while len(self._pending) > self._latency:
+            frame_id, queries = self._pending[0]
+            overdue = len(self._pending) > self._latency * 4
+            if queries and not overdue and not self._available(queries[-1][1]):
+                break
+            self._pending.popleft()
+            results.append((frame_id, self._collect(queries)))
+        return results
+
+    @staticmethod
+    def _available(query) -> bool:
+        return bool(gl.glGetQueryObjectiv(query, gl.GL_QUERY_RESULT_AVAILABLE, None))
+
+    def _collect(self, queries) -> Dict[str, float]:
+        # queries finish in order, the last one being available means all are
+        totals = {category: 0.0 for category in self.categories}
+        for category, query in queries:
+            # PyOpenGL can not allocate a 64 bit unsigned output itself
+            nanoseconds = ctypes.c_uint64()
+            gl.glGetQueryObjectui64v(query, gl.GL_QUERY_RESULT, ctypes.byref(nanoseconds))
+            totals[category] = totals.get(category, 0.0) + nanoseconds.value * 1e-9
+            self._free.append(query)
+        return totals
+
+    def delete(self):
+        """Free all query objects and drop the pending results."""
+        queries = list(self._free)
+        for _, frame in self._pending:
+            queries.extend(query for _, query in frame)
+        queries.extend(query for _, query in self._frame)
+        if queries:
+            gl.glDeleteQueries(len(queries), queries)
+        self._free = []
+        self._frame = []
+        self._pending.clear()
+        self._depth = 0
+
+
+timer = GpuTimer()
@@ -2,16 +2,17 @@ import glm
 from OpenGL.GL import GL_LINES
 
 import pxng
+from pxng.gpu_timer import timer
 
 
 class Grid:
     def __init__(self, width, height):
-        program = pxng.ShaderProgram('GridShader')
-        program.add_shader(pxng.resource('shaders/line.vert'), pxng.ShaderType.Vertex)
-        program.add_shader(pxng.resource('shaders/line.frag'), pxng.ShaderType.Fragment)
-        program.compile_and_link()
+        program = pxng.ShaderProgram.acquire('GridShader', [
+            (pxng.resource('shaders/line.vert'), pxng.ShaderType.Vertex),
+            (pxng.resource('shaders/line.frag'), pxng.ShaderType.Fragment),
+        ])
 
-        program.add_uniform('projection_view', glm.mat4x4)
+        program.add_uniform_block('Matrices', pxng.MatrixBlock.binding)
         program.add_uniform('model', glm.mat4x4)
         program.add_uniform('color', glm.vec4)
         program.add_uniform('resolution', glm.vec2)
@@ -39,13 +40,14 @@ class Grid:
             spaces.model.scale((size, size, 1))
             program = self._shader_program
             program.activate()
-            program.set_uniform('projection_view', spaces.projection_view)
             program.set_uniform('model', spaces.model.m)
             program.set_uniform('color', spaces.tint)
             program.set_uniform('resolution', glm.vec2(spaces.width, spaces.height))
             program.set_uniform('dash_size', dash_size)
             program.set_uniform('gap_size', gap_size)
 
+            timer.begin('grid')
             self._vao.draw()
+            timer.end()
 
             spaces.model.pop()
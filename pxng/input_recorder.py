@@ -0,0 +1,117 @@
+import struct
+from typing import List, Optional, Tuple
+
+from pxng.mouse import MouseInput
+
+# File layout, all little endian:
+#   header: magic, version, initial cursor x and y
+#   frame:  elapsed time, cursor x and y, scroll x and y, hover,
+#           key event count, button event count,
+#           key events (key, action), button events (button, action)
+_MAGIC = b'PXNGINPT'
+_VERSION = 1
+_HEADER = struct.Struct('<8sHdd')
+_FRAME = struct.Struct('<ddddd?HH')
+_KEY_EVENT = struct.Struct('<hB')
+_BUTTON_EVENT = struct.Struct('<BB')
+
+
+class InputFrame:
+    def __init__(self, elapsed_time, key_events, mouse_input: MouseInput):
+        """The input of a single frame and the time that passed before it."""
+        self.elapsed_time = elapsed_time
+        self.key_events: List[Tuple[int, int]] = key_events
+        self.mouse_input = mouse_input
+
+
+class InputRecorder:
+    def __init__(self, path, cursor_pos=(0.0, 0.0)):
+        """
+        Writes the input of every frame to a compact binary log that can be
+        played back with *InputReplay*.
+
+        Parameters
+        ----------
+        path: str
+            File to write.
+        cursor_pos: tuple of (float, float)
+            The cursor position before the first frame.
+        """
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION, *cursor_pos))
+        self._frame_count = 0
+
+    @property
+    def frame_count(self):
+        return self._frame_count
+
+    def write_frame(self, frame: InputFrame):
+        mouse_input = frame.mouse_input
+        parts = [_FRAME.pack(frame.elapsed_time, mouse_input.x, mouse_input.y,
+                             mouse_input.scroll_x, mouse_input.scroll_y, mouse_input.hover,
+                             len(frame.key_events), len(mouse_input.events))]
+        parts.extend(_KEY_EVENT.pack(key, action) for key, action in frame.key_events)
+        parts.extend(_BUTTON_EVENT.pack(button, action) for button, action in mouse_input.events)
+        self._file.write(b''.join(parts))
+        self._frame_count += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class InputReplay:
+    def __init__(self, path):
+        """
+        Reads an input log written by *InputRecorder* frame by frame.
+
+        Parameters
+        ----------
+        path: str
+            File to read.
+        """
+        with open(path, 'rb') as fh:
+            self._data = fh.read()
+
+        if len(self._data) < _HEADER.size:
+            raise UserWarning(f'Not an input log: {path}')
+        magic, version, x, y = _HEADER.unpack_from(self._data, 0)
+        if magic != _MAGIC:
+            raise UserWarning(f'Not an input log: {path}')
+        if version != _VERSION:
+            raise UserWarning(f'Unsupported input log version: {version}')
+
+        self._cursor_pos = (x, y)
+        self._offset = _HEADER.size
+        self._frame_count = 0
+
+    @property
+    def cursor_pos(self) -> Tuple[float, float]:
+        """The cursor position before the first frame."""
+        return self._cursor_pos
+
+    @property
+    def frame_count(self):
+        """Number of frames read so far."""
+        return self._frame_count
+
+    def next_frame(self) -> Optional[InputFrame]:
+        """Returns the next frame or None at the end of the log."""
+        data = self._data
+        offset = self._offset
+        if offset + _FRAME.size > len(data):
+            return None
+
+        elapsed, x, y, scroll_x, scroll_y, hover, key_count, button_count = \
+            _FRAME.unpack_from(data, offset)
+        offset += _FRAME.size
+
+        key_events = list(_KEY_EVENT.iter_unpack(data[offset:offset + key_count * _KEY_EVENT.size]))
+        offset += key_count * _KEY_EVENT.size
+        button_events = list(_BUTTON_EVENT.iter_unpack(data[offset:offset + button_count * _BUTTON_EVENT.size]))
+        offset += button_count * _BUTTON_EVENT.size
+
+        self._offset = offset
+        self._frame_count += 1
+        mouse_input = MouseInput(x, y, hover, scroll_x, scroll_y, button_events)
+        return InputFrame(elapsed, key_events, mouse_input)
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, List, Tuple
 
 import glfw
 
@@ -182,3 +182,54 @@ class KeyPoller:
 
     def key_state(self, key) -> KeyState:
         return self._key_states[key]
+
+
+class KeyListener(KeyPoller):
+    def __init__(self, glfw_window):
+        """
+        Event driven keyboard state. The glfw key callback records the
+        transitions as they happen and *poll_keys* applies them once per
+        frame, so only keys that changed are touched and a press and
+        release between two frames is still reported.
+
+        Parameters
+        ----------
+        glfw_window
+            The window to receive key events from.
+        """
+        super().__init__()
+        self._events: List[Tuple[int, int]] = []
+        self._touched: List[KeyState] = []
+        glfw.set_key_callback(glfw_window, self._key_callback)
+
+    def _key_callback(self, window, key, scancode, action, mods):
+        if action != glfw.REPEAT and key in self._key_states:
+            self._events.append((key, action))
+
+    def take_events(self) -> List[Tuple[int, int]]:
+        """Returns and clears the (key, action) transitions received since the last call."""
+        events = self._events
+        self._events = []
+        return events
+
+    def apply_events(self, events: List[Tuple[int, int]]):
+        """Advance the key states by one frame with the given (key, action) transitions."""
+        # the one frame flags are only set on keys that changed last frame
+        for key_state in self._touched:
+            key_state.pressed = False
+            key_state.released = False
+        self._touched.clear()
+
+        for key, action in events:
+            key_state = self._key_states[key]
+            if action == glfw.PRESS:
+                key_state.pressed = True
+                key_state.held = True
+            elif key_state.held:
+                # pressed stays set when the key went down in the same frame
+                key_state.released = True
+                key_state.held = False
+            self._touched.append(key_state)
+
+    def poll_keys(self, window):
+        self.apply_events(self.take_events())
@@ -0,0 +1,58 @@
+import numpy
+from OpenGL.GL import (GL_UNIFORM_BUFFER, GL_DYNAMIC_DRAW, glGenBuffers, glBindBuffer,
+                       glBufferData, glBufferSubData, glBindBufferBase)
+
+import pxng
+from pxng.render_stats import counters
+
+
+class MatrixBlock:
+    # uniform buffer binding point of the Matrices block in all pxng shaders
+    binding = 0
+
+    def __init__(self):
+        """
+        A uniform buffer with the projection, view and projection * view
+        matrices shared by all pxng shaders through the std140 block:
+
+            layout (std140) uniform Matrices {
+                mat4 projection;
+                mat4 view;
+                mat4 projection_view;
+            };
+
+        The buffer is only written when the projection or view changed.
+        """
+        self._data = numpy.zeros((3, 4, 4), dtype=numpy.float32)
+        self._versions = None
+
+        self._ubo = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self._ubo)
+        glBufferData(GL_UNIFORM_BUFFER, self._data.nbytes, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, self.binding, self._ubo)
+
+    def update(self, spaces: pxng.Spaces) -> bool:
+        """
+        Upload the matrices of *spaces* if they changed since the last update.
+
+        Returns
+        -------
+        bool
+            True if the buffer was written.
+        """
+        versions = (spaces.projection.version, spaces.view.version)
+        if versions == self._versions:
+            return False
+
+        # std140 stores a mat4 as 4 column vectors
+        self._data[0] = numpy.asarray(spaces.projection.m).T
+        self._data[1] = numpy.asarray(spaces.view.m).T
+        self._data[2] = numpy.asarray(spaces.projection_view).T
+
+        glBindBuffer(GL_UNIFORM_BUFFER, self._ubo)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, self._data.nbytes, self._data)
+        counters.bytes_uploaded += self._data.nbytes
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        self._versions = versions
+        return True
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Tuple
+from typing import List, Tuple
 
 import glfw
 
@@ -37,6 +37,20 @@ class MouseButtonState:
         return f'self.pressed={self.pressed} self.released={self.released} self.held={self.held}'
 
 
+@dataclass
+class MouseInput:
+    """The mouse input of one frame as received by *MouseListener*."""
+    x: float
+    y: float
+    hover: bool
+    scroll_x: float
+    scroll_y: float
+    events: List[Tuple[int, int]]
+    """
+    list of (button, action): The button transitions in the order they happened.
+    """
+
+
 class Mouse:
     def __init__(self, glfw_window):
         self._buttons = {
@@ -235,3 +249,88 @@ class Mouse:
     def _scroll_callback(self, window, x, y):
         self._scroll_dx += x
         self._scroll_dy += y
+
+
+class MouseListener(Mouse):
+    def __init__(self, glfw_window):
+        """
+        Event driven mouse state. Button, cursor and enter/leave callbacks
+        record what happened and *_poll_mouse* applies it once per frame,
+        touching only the buttons that changed. A click between two frames
+        is reported as pressed and released in the same frame.
+
+        Parameters
+        ----------
+        glfw_window
+            The window to receive mouse events from.
+        """
+        super().__init__(glfw_window)
+        self._events: List[Tuple[int, int]] = []
+        self._touched: List[MouseButtonState] = []
+        self._scroll_x = 0
+        self._scroll_y = 0
+        self._hover = glfw.get_window_attrib(glfw_window, glfw.HOVERED) == 1
+        self._cursor_x, self._cursor_y = glfw.get_cursor_pos(glfw_window)
+        self._x, self._y = self._cursor_x, self._cursor_y
+
+        glfw.set_mouse_button_callback(glfw_window, self._mouse_button_callback)
+        glfw.set_cursor_pos_callback(glfw_window, self._cursor_pos_callback)
+        glfw.set_cursor_enter_callback(glfw_window, self._cursor_enter_callback)
+
+    def _mouse_button_callback(self, window, button, action, mods):
+        if button in self._buttons:
+            self._events.append((button, action))
+
+    def _cursor_pos_callback(self, window, x, y):
+        self._cursor_x = x
+        self._cursor_y = y
+
+    def _cursor_enter_callback(self, window, entered):
+        self._hover = bool(entered)
+
+    def _scroll_callback(self, window, x, y):
+        # applied with the rest of the input of the frame
+        self._scroll_x += x
+        self._scroll_y += y
+
+    def move_to(self, x, y):
+        """Set the cursor position without reporting a movement."""
+        self._x = self._cursor_x = x
+        self._y = self._cursor_y = y
+
+    def take_input(self) -> MouseInput:
+        """Returns and clears the mouse input received since the last call."""
+        mouse_input = MouseInput(self._cursor_x, self._cursor_y, self._hover,
+                                 self._scroll_x, self._scroll_y, self._events)
+        self._scroll_x = 0
+        self._scroll_y = 0
+        self._events = []
+        return mouse_input
+
+    def apply_input(self, mouse_input: MouseInput):
+        """Advance the mouse state by one frame."""
+        self._dx = self._x - mouse_input.x
+        self._dy = self._y - mouse_input.y
+        self._x = mouse_input.x
+        self._y = mouse_input.y
+        self._hover = mouse_input.hover
+        self._scroll_dx += mouse_input.scroll_x
+        self._scroll_dy += mouse_input.scroll_y
+
+        for btn_state in self._touched:
+            btn_state.pressed = False
+            btn_state.released = False
+        self._touched.clear()
+
+        for button, action in mouse_input.events:
+            btn_state = self._buttons[button]
+            if action == glfw.PRESS:
+                btn_state.pressed = True
+                btn_state.held = True
+            elif btn_state.held:
+                btn_state.released = True
+                btn_state.held = False
+            self._touched.append(btn_state)
+
+    def _poll_mouse(self, window):
+        self.apply_input(self.take_input())
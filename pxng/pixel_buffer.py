@@ -0,0 +1,70 @@
+import ctypes
+
+from numpy.core.multiarray import ndarray
+from OpenGL.GL import (GL_PIXEL_UNPACK_BUFFER, GL_STREAM_DRAW, GL_MAP_WRITE_BIT,
+                       GL_MAP_INVALIDATE_BUFFER_BIT, GL_UNSIGNED_BYTE, glGenBuffers,
+                       glBindBuffer, glBufferData, glMapBufferRange, glUnmapBuffer,
+                       glTexSubImage2D, glDeleteBuffers)
+
+from pxng.render_stats import counters
+
+
+class PixelBuffer:
+    def __init__(self, count=2):
+        """
+        A ring of pixel unpack buffers (PBOs) for streaming texture uploads.
+
+        The pixel data is copied into a mapped buffer and the texture update
+        is sourced from that buffer, so the copy into the texture can happen
+        asynchronously. Every upload uses the next buffer in the ring and
+        never waits for the transfer started in the previous frame.
+
+        Parameters
+        ----------
+        count: int
+            Number of buffers in the ring. 2 for double and 3 for triple
+            buffering.
+        """
+        self._buffers = [glGenBuffers(1) for _ in range(count)]
+        self._sizes = [0] * count
+        self._index = 0
+
+    @property
+    def count(self):
+        return len(self._buffers)
+
+    def delete(self):
+        glDeleteBuffers(len(self._buffers), self._buffers)
+        self._sizes = [0] * len(self._buffers)
+
+    def upload(self, target, data: ndarray, x, y, width, height, fmt):
+        """
+        Upload a contiguous block of pixels into a texture region.
+
+        The texture must be bound to *target* before calling this.
+        """
+        index = self._index
+        self._index = (index + 1) % len(self._buffers)
+
+        size = data.nbytes
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, self._buffers[index])
+        if size > self._sizes[index]:
+            glBufferData(GL_PIXEL_UNPACK_BUFFER, size, None, GL_STREAM_DRAW)
+            self._sizes[index] = size
+
+        access = GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_BUFFER_BIT
+        ptr = glMapBufferRange(GL_PIXEL_UNPACK_BUFFER, 0, size, access)
+        if not ptr:
+            # mapping failed -> upload directly from client memory
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+            glTexSubImage2D(target, 0, x, y, width, height, fmt, GL_UNSIGNED_BYTE, data)
+            counters.bytes_uploaded += size
+            return
+
+        ctypes.memmove(ptr, data.ctypes.data, size)
+        glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+
+        # with a bound unpack buffer the pixel pointer is an offset into the buffer
+        glTexSubImage2D(target, 0, x, y, width, height, fmt, GL_UNSIGNED_BYTE, None)
+        counters.bytes_uploaded += size
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
@@ -1,29 +1,68 @@
 import glm
+import numpy
 from OpenGL.GL import GL_TRIANGLES
 
 import pxng
 from pxng import resource
+from pxng._utils import colors_array, color_bytes
+from pxng.gpu_timer import timer
+from pxng.render_stats import counters
 
 
 class Quad:
-    def __init__(self):
-        program = pxng.ShaderProgram('QuadShader')
-        program.add_shader(resource('shaders/quad.vert'), pxng.ShaderType.Vertex)
-        program.add_shader(resource('shaders/quad.frag'), pxng.ShaderType.Fragment)
-        program.compile_and_link()
+    def __init__(self, instanced=False):
+        """
+        Batched rectangle renderer.
 
-        program.add_uniform('projection_view', glm.mat4x4)
+        Parameters
+        ----------
+        instanced: bool
+            Upload one compact record per rectangle (x, y, w, h and an RGBA8
+            color) and draw them as instances of a shared unit quad instead
+            of expanding every rectangle into 4 vertices and 6 indices.
+        """
+        self._instanced = instanced
+
+        vertex_shader = 'shaders/quad_instanced.vert' if instanced else 'shaders/quad.vert'
+        program = pxng.ShaderProgram.acquire('QuadShader', [
+            (resource(vertex_shader), pxng.ShaderType.Vertex),
+            (resource('shaders/quad.frag'), pxng.ShaderType.Fragment),
+        ])
+
+        program.add_uniform_block('Matrices', pxng.MatrixBlock.binding)
 
         self._shader_program = program
 
         self._vao = pxng.VertexArrayObject(GL_TRIANGLES)
         self._vao.attach_buffer(pxng.BufferObject(data_type=glm.vec3))  # vertex buffer
-        self._vao.attach_buffer(pxng.BufferObject(data_type=glm.vec4))  # color buffer
+
+        if instanced:
+            self._rects = pxng.BufferObject(data_type=glm.vec4, divisor=1)
+            self._colors = pxng.BufferObject(data_type=glm.u8vec4, divisor=1, normalized=True)
+            self._vao.attach_buffer(self._rects)  # instance rect buffer
+            self._vao.attach_buffer(self._colors)  # instance color buffer
+
+            self._vao.add_quad(
+                glm.vec3(0, 0, 0),
+                glm.vec3(0, 1, 0),
+                glm.vec3(1, 1, 0),
+                glm.vec3(1, 0, 0),
+            )
+        else:
+            self._vao.attach_buffer(pxng.BufferObject(data_type=glm.vec4))  # color buffer
 
         self._started = False
 
+    @property
+    def instanced(self):
+        return self._instanced
+
     def start_batch(self):
-        self._vao.reset()
+        if self._instanced:
+            self._rects.reset()
+            self._colors.reset()
+        else:
+            self._vao.reset()
         self._started = True
 
     def check_started(self):
@@ -31,23 +70,67 @@ class Quad:
             self.start_batch()
 
     def draw(self, spaces: pxng.Spaces, x, y, w, h):
+        tint = spaces.tint
+
+        if self._instanced:
+            self._rects.set_value(glm.vec4(x, y, w, h))
+            self._colors.set_value(glm.u8vec4(glm.clamp(tint, 0, 1) * 255 + 0.5))
+            return
+
         p1 = glm.vec3(x, y, 0)
         p2 = glm.vec3(x, y + h, 0)
         p3 = glm.vec3(x + w, y + h, 0)
         p4 = glm.vec3(x + w, y, 0)
 
         self._vao.add_quad(p1, p2, p3, p4)
-        tint = spaces.tint
         self._vao.set_colors(tint, tint, tint, tint)
 
+    def draw_rects(self, spaces: pxng.Spaces, xs, ys, ws, hs, colors=None):
+        xs = numpy.asarray(xs, dtype=numpy.float32).ravel()
+        ys = numpy.asarray(ys, dtype=numpy.float32).ravel()
+        ws = numpy.asarray(ws, dtype=numpy.float32).ravel()
+        hs = numpy.asarray(hs, dtype=numpy.float32).ravel()
+        count = max(len(xs), len(ys), len(ws), len(hs))
+
+        if self._instanced:
+            rects = numpy.empty((count, 4), dtype=numpy.float32)
+            rects[:, 0] = xs
+            rects[:, 1] = ys
+            rects[:, 2] = ws
+            rects[:, 3] = hs
+            self._rects.extend(rects)
+            self._colors.extend(color_bytes(colors, count, spaces.tint))
+            return
+
+        positions = numpy.zeros((count, 4, 3), dtype=numpy.float32)
+        positions[:, 0, 0] = xs
+        positions[:, 0, 1] = ys
+        positions[:, 1, 0] = xs
+        positions[:, 1, 1] = ys + hs
+        positions[:, 2, 0] = xs + ws
+        positions[:, 2, 1] = ys + hs
+        positions[:, 3, 0] = xs + ws
+        positions[:, 3, 1] = ys
+
+        self._vao.add_quads(positions, colors_array(colors, count, spaces.tint))
+
     def draw_batch(self, spaces: pxng.Spaces):
+        if self._instanced and len(self._rects) == 0:
+            self._started = False
+            return
+
         if self._vao.bind():
             program = self._shader_program
             program.activate()
-            program.set_uniform('projection_view', spaces.projection_view)
-            self._vao.draw()
+            timer.begin('quad')
+            if self._instanced:
+                self._vao.draw_instanced(len(self._rects))
+            else:
+                self._vao.draw()
+            timer.end()
             self._started = False
 
     def draw_batch_if_started(self, spaces):
         if self._started:
+            counters.batch_flushes += 1
             self.draw_batch(spaces)
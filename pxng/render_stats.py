@@ -0,0 +1,57 @@
+from typing import Dict
+
+
+class RenderStats:
+    fields = ('draw_calls', 'vertices', 'indices', 'bytes_uploaded', 'texture_binds',
+              'program_switches', 'batch_flushes')
+
+    def __init__(self):
+        """
+        Counters for the work submitted to OpenGL. All of pxng counts into
+        the shared *counters* instance; the window copies it into
+        *Window.stats* at the end of every frame and starts over.
+
+        Attributes
+        ----------
+        draw_calls: int
+            glDrawElements/glDrawArrays calls, including instanced ones.
+        vertices: int
+            Vertices submitted. Instanced draws count every instance.
+        indices: int
+            Indices submitted by indexed draws.
+        bytes_uploaded: int
+            Bytes sent to buffers and textures.
+        texture_binds: int
+            Texture binds that reached GL (not skipped by the state cache).
+        program_switches: int
+            Program changes that reached GL.
+        batch_flushes: int
+            Batches drawn because a different kind of primitive was drawn or
+            the frame ended.
+        """
+        self.draw_calls = 0
+        self.vertices = 0
+        self.indices = 0
+        self.bytes_uploaded = 0
+        self.texture_binds = 0
+        self.program_switches = 0
+        self.batch_flushes = 0
+
+    def reset(self):
+        for field in self.fields:
+            setattr(self, field, 0)
+
+    def copy(self) -> 'RenderStats':
+        stats = RenderStats()
+        for field in self.fields:
+            setattr(stats, field, getattr(self, field))
+        return stats
+
+    def as_dict(self) -> Dict[str, int]:
+        return {field: getattr(self, field) for field in self.fields}
+
+    def __str__(self):
+        return ' '.join(f'{field}={getattr(self, field)}' for field in self.fields)
+
+
+counters = RenderStats()
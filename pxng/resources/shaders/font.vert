@@ -1,15 +1,21 @@
 #version 330 core
 layout (location=0) in vec3 position;
 layout (location=1) in uint character;
+layout (location=2) in vec4 basis;
+layout (location=3) in vec4 color;
 
-uniform mat4 projection_view;
-uniform mat4 model;
 uniform uint grid_width = 16u;
+uniform ivec2 cell_size = ivec2(8, 8);
 
 out ivec2 char_tex;
+out vec4 glyph_basis;
+out vec4 glyph_color;
 
 void main() {
     gl_Position = vec4(position, 1.0f);
-    ivec2 xy = ivec2(character % grid_width, character / grid_width - 2u);
-    char_tex = xy * 8;
+    // character is the index of the glyph cell in the atlas
+    ivec2 xy = ivec2(character % grid_width, character / grid_width);
+    char_tex = xy * cell_size;
+    glyph_basis = basis;
+    glyph_color = color;
 }
\ No newline at end of file
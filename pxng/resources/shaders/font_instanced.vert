@@ -0,0 +1,35 @@
+#version 330 core
+layout (location=0) in vec3 position;
+layout (location=1) in uint character;
+layout (location=2) in vec4 basis;
+layout (location=3) in vec4 glyph_color;
+
+layout (std140) uniform Matrices {
+    mat4 projection;
+    mat4 view;
+    mat4 projection_view;
+};
+uniform mat4 model;
+uniform vec4 color = vec4(1, 1, 1, 1);
+uniform uint grid_width = 16u;
+uniform ivec2 glyph_size = ivec2(8, 8);
+uniform ivec2 cell_size = ivec2(8, 8);
+
+out vec2 tex_coord;
+out vec4 vertex_color;
+
+void main() {
+    // one instance per glyph, the corner of the quad comes from the vertex index of the strip
+    vec2 corner = vec2(gl_VertexID & 1, gl_VertexID >> 1);
+
+    // glyph x and y axes with scale and rotation of the string baked in
+    vec2 x_axis = basis.xy * float(glyph_size.x);
+    vec2 y_axis = basis.zw * float(glyph_size.y);
+    vec2 pos = position.xy + x_axis * corner.x + y_axis * corner.y;
+    gl_Position = projection_view * model * vec4(pos, position.z, 1.0f);
+
+    // character is the index of the glyph cell in the atlas
+    ivec2 xy = ivec2(character % grid_width, character / grid_width);
+    tex_coord = vec2(xy * cell_size) + corner * vec2(cell_size);
+    vertex_color = color * glyph_color;
+}
\ No newline at end of file
@@ -0,0 +1,15 @@
+#version 330 core
+out vec4 out_color;
+
+in vec4 vertex_color;
+in vec2 tex_coord;
+
+uniform sampler2DRect sprite_texture;
+
+void main() {
+    // 0.5 is the glyph edge, the screen space derivative keeps the edge one pixel wide at any scale
+    float distance = texture(sprite_texture, tex_coord).r;
+    float width = fwidth(distance);
+    float alpha = smoothstep(0.5 - width, 0.5 + width, distance);
+    out_color = vertex_color * alpha;
+}
\ No newline at end of file
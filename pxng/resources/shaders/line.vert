@@ -2,7 +2,11 @@
 layout (location=0) in vec3 position;
 
 uniform vec4 color;
-uniform mat4 projection_view;
+layout (std140) uniform Matrices {
+    mat4 projection;
+    mat4 view;
+    mat4 projection_view;
+};
 uniform mat4 model;
 
 flat out vec3 start_pos;
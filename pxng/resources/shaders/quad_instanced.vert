@@ -0,0 +1,18 @@
+#version 330 core
+layout (location=0) in vec3 position;
+layout (location=1) in vec4 rect;
+layout (location=2) in vec4 color;
+
+layout (std140) uniform Matrices {
+    mat4 projection;
+    mat4 view;
+    mat4 projection_view;
+};
+
+out vec4 vertex_color;
+
+void main() {
+    vertex_color = color;
+    vec3 pos = vec3(rect.xy + position.xy * rect.zw, position.z);
+    gl_Position = projection_view * vec4(pos, 1.0f);
+}
\ No newline at end of file
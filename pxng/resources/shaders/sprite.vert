@@ -2,7 +2,11 @@
 layout (location=0) in vec3 position;
 layout (location=1) in uvec2 tex;
 
-uniform mat4 projection_view;
+layout (std140) uniform Matrices {
+    mat4 projection;
+    mat4 view;
+    mat4 projection_view;
+};
 uniform mat4 model;
 uniform mat4 texture_matrix;
 uniform vec4 color;
@@ -0,0 +1,19 @@
+#version 330 core
+layout (location=0) in vec3 position;
+layout (location=1) in vec2 tex;
+layout (location=2) in vec4 color;
+
+layout (std140) uniform Matrices {
+    mat4 projection;
+    mat4 view;
+    mat4 projection_view;
+};
+
+out vec4 vertex_color;
+out vec2 tex_coord;
+
+void main() {
+    vertex_color = color;
+    gl_Position = projection_view * vec4(position, 1.0f);
+    tex_coord = tex;
+}
\ No newline at end of file
@@ -0,0 +1,109 @@
+import time
+
+
+class FrameScheduler:
+    def __init__(self, target_fps=None, spin_time=0.002):
+        """
+        Paces the frames of the event loop and drives fixed timestep updates.
+
+        Frames are limited to *target_fps* by sleeping until shortly before
+        the next frame is due and busy waiting the rest of the way. The sleep
+        leaves the core idle, the short spin keeps the frame start precise
+        even though the operating system may wake a sleeping thread late.
+
+        Parameters
+        ----------
+        target_fps: float
+            Maximum number of frames per second. None means unlimited.
+        spin_time: float
+            Seconds before a frame is due to stop sleeping and start spinning.
+        """
+        self._frame_time = None
+        self.target_fps = target_fps
+        self._spin_time = spin_time
+        self._next_frame = None
+        self._last_frame = None
+
+        self._fixed_step = None
+        self._max_steps = 1
+        self._accumulator = 0.0
+        self._alpha = 0.0
+
+    @property
+    def target_fps(self):
+        return None if self._frame_time is None else 1 / self._frame_time
+
+    @target_fps.setter
+    def target_fps(self, target_fps):
+        self._frame_time = 1 / target_fps if target_fps else None
+        self._next_frame = None
+
+    @property
+    def fixed_step(self):
+        """Seconds per fixed update or None if fixed updates are off."""
+        return self._fixed_step
+
+    @property
+    def alpha(self) -> float:
+        """
+        How far the current frame is between the last and the next fixed
+        update, in the range [0, 1). Use it to interpolate rendered state.
+        """
+        return self._alpha
+
+    def set_fixed_rate(self, rate, max_steps=5):
+        """
+        Parameters
+        ----------
+        rate: float
+            Fixed updates per second. None turns fixed updates off.
+        max_steps: int
+            Maximum number of updates in a single frame. Time beyond that is
+            dropped, so a slow frame does not cause an ever growing backlog.
+        """
+        self._fixed_step = 1 / rate if rate else None
+        self._max_steps = max_steps
+        self._accumulator = 0.0
+        self._alpha = 0.0
+
+    def begin_frame(self) -> float:
+        """Start a frame. Returns the seconds since the start of the previous frame."""
+        now = time.perf_counter()
+        elapsed = 0.0 if self._last_frame is None else now - self._last_frame
+        self._last_frame = now
+        return elapsed
+
+    def fixed_steps(self, elapsed) -> int:
+        """Returns how many fixed updates to run for a frame of *elapsed* seconds."""
+        step = self._fixed_step
+        if step is None:
+            return 0
+
+        self._accumulator += elapsed
+        steps = min(int(self._accumulator / step), self._max_steps)
+        self._accumulator -= steps * step
+        if self._accumulator >= step:
+            # too far behind, skip the time that did not fit
+            self._accumulator %= step
+        self._alpha = self._accumulator / step
+        return steps
+
+    def wait(self):
+        """Wait until the next frame is due."""
+        frame_time = self._frame_time
+        if frame_time is None:
+            return
+
+        now = time.perf_counter()
+        if self._next_frame is None or now - self._next_frame > frame_time:
+            # first frame or more than a frame late -> do not try to catch up
+            self._next_frame = now + frame_time
+            return
+
+        deadline = self._next_frame
+        remaining = deadline - now
+        if remaining > self._spin_time:
+            time.sleep(remaining - self._spin_time)
+        while time.perf_counter() < deadline:
+            pass
+        self._next_frame = deadline + frame_time
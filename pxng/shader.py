@@ -1,9 +1,18 @@
+from copy import copy
 from enum import Enum
+import hashlib
+import os
 import os.path
-from typing import List
+import time
+from typing import Dict, List, Tuple
 
 import glm
+import numpy
 import OpenGL.GL as gl
+from OpenGL.error import GLError
+
+from pxng._utils import cache_dir, write_cache_file
+from pxng.gl_state import state
 
 
 class ShaderType(Enum):
@@ -73,6 +82,12 @@ class _Shader:
 
         return status == gl.GL_TRUE
 
+    def delete(self):
+        if self._id is not None:
+            gl.glDeleteShader(self._id)
+            self._id = None
+            self._attached = False
+
     def failed_compile(self):
         return self._failed_version is not None
 
@@ -90,6 +105,9 @@ class _Shader:
 
 
 class ShaderProgram:
+    # compiled programs shared by everyone that acquires the same shaders
+    _registry: Dict[tuple, 'ShaderProgram'] = {}
+
     def __init__(self, name, frag_data_location=0, frag_data_name='out_color'):
         self._name = name
         self._shaders: List[_Shader] = []
@@ -97,6 +115,69 @@ class ShaderProgram:
         self._frag_data_loc = frag_data_location
         self._frag_data_name = frag_data_name
         self._uniforms = {}
+        self._uniform_blocks = {}
+        self._key = None
+        self._ref_count = 0
+        self._from_binary_cache = False
+        self._build_time = 0.0
+
+    @classmethod
+    def acquire(cls, name, shaders: List[Tuple[str, ShaderType]],
+                frag_data_location=0, frag_data_name='out_color') -> 'ShaderProgram':
+        """
+        Returns a compiled and linked program for the given shaders.
+
+        Programs are shared: the first call compiles and links the program
+        and every following call with the same shaders returns the same
+        instance. Call *release* when the program is no longer needed.
+
+        Parameters
+        ----------
+        name: str
+            Name used in error messages.
+        shaders: list of (str, ShaderType)
+            Paths and types of the shaders in the program.
+        """
+        key = (tuple((path, shader_type) for path, shader_type in shaders),
+               frag_data_location, frag_data_name)
+        program = cls._registry.get(key)
+        if program is None:
+            program = cls(name, frag_data_location, frag_data_name)
+            for path, shader_type in shaders:
+                program.add_shader(path, shader_type)
+            program.compile_and_link()
+            program._key = key
+            cls._registry[key] = program
+
+        program._ref_count += 1
+        return program
+
+    def release(self):
+        """Release a program returned by *acquire* and delete it when unused."""
+        self._ref_count -= 1
+        if self._ref_count <= 0 and self._key is not None:
+            del self._registry[self._key]
+            self._key = None
+            self.delete()
+
+    @classmethod
+    def clear_registry(cls):
+        """Forget all shared programs without deleting them, e.g. after their context was destroyed."""
+        for program in cls._registry.values():
+            program._key = None
+        cls._registry.clear()
+
+    @property
+    def ref_count(self):
+        return self._ref_count
+
+    def delete(self):
+        for shader in self._shaders:
+            shader.delete()
+        if self._id is not None:
+            gl.glDeleteProgram(self._id)
+            self._id = None
+            state.invalidate()
 
     def add_shader(self, path, shader_type: ShaderType):
         self._shaders.append(_Shader(path, shader_type))
@@ -105,9 +186,20 @@ class ShaderProgram:
         self._uniforms[name] = {
             'loc': self.get_uniform_location(name),
             'type': data_type,
-            'fn': self._get_gl_function_for_type(data_type)
+            'fn': self._get_gl_function_for_type(data_type),
+            'value': None
         }
 
+    def add_uniform_block(self, name, binding):
+        """Connect the uniform block *name* to a uniform buffer binding point."""
+        self._uniform_blocks[name] = binding
+        self._bind_uniform_block(name, binding)
+
+    def _bind_uniform_block(self, name, binding):
+        index = gl.glGetUniformBlockIndex(self._id, name)
+        if index != gl.GL_INVALID_INDEX:
+            gl.glUniformBlockBinding(self._id, index, binding)
+
     @staticmethod
     def _get_gl_function_for_type(data_type):
         if data_type == glm.mat4x4:
@@ -132,6 +224,10 @@ class ShaderProgram:
             return fn
         elif data_type == glm.vec1:
             return gl.glUniform1f
+        elif data_type == glm.ivec2:
+            def fn(loc, value):
+                gl.glUniform2iv(loc, 1, glm.value_ptr(value))
+            return fn
         elif data_type == glm.ivec1:
             return gl.glUniform1i
         elif data_type == glm.uvec1:
@@ -141,10 +237,84 @@ class ShaderProgram:
         else:
             raise UserWarning(f'Unknown data type: {data_type}')
 
+    @property
+    def from_binary_cache(self) -> bool:
+        """True if the program was loaded from the on-disk binary cache."""
+        return self._from_binary_cache
+
+    @property
+    def build_time(self) -> float:
+        """Seconds spent in the last *compile_and_link*."""
+        return self._build_time
+
+    @staticmethod
+    def _binary_cache_supported():
+        if not bool(gl.glGetProgramBinary) or not bool(gl.glProgramBinary):
+            return False
+        return gl.glGetIntegerv(gl.GL_NUM_PROGRAM_BINARY_FORMATS) > 0
+
+    def _binary_cache_path(self):
+        directory = cache_dir('shaders')
+        if directory is None or not self._binary_cache_supported():
+            return None
+
+        digest = hashlib.sha256()
+        for name in (gl.GL_VENDOR, gl.GL_RENDERER, gl.GL_VERSION):
+            digest.update(gl.glGetString(name) or b'')
+        digest.update(f'{self._frag_data_loc}:{self._frag_data_name}'.encode('utf-8'))
+        for shader in self._shaders:
+            digest.update(str(shader.type.value).encode('utf-8'))
+            with open(shader.path, 'rb') as fh:
+                digest.update(fh.read())
+        return directory / f'{digest.hexdigest()}.bin'
+
+    def _load_binary(self, path):
+        if path is None or not path.exists():
+            return False
+
+        try:
+            data = numpy.fromfile(str(path), dtype=numpy.uint8)
+            if data.size <= 4:
+                raise ValueError('truncated program binary')
+            binary_format = int(data[:4].view(numpy.uint32)[0])
+            binary = data[4:]
+            gl.glProgramBinary(self._id, binary_format, binary, binary.size)
+            linked = gl.glGetProgramiv(self._id, gl.GL_LINK_STATUS, None) == gl.GL_TRUE
+        except (OSError, ValueError, GLError):
+            linked = False
+
+        if not linked:
+            # driver update or corrupt file -> rebuild from source
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return False
+        return True
+
+    def _store_binary(self, path):
+        size = gl.glGetProgramiv(self._id, gl.GL_PROGRAM_BINARY_LENGTH, None)
+        if size <= 0:
+            return
+
+        binary = numpy.zeros(size, dtype=numpy.uint8)
+        length = numpy.zeros(1, dtype=numpy.int32)
+        binary_format = numpy.zeros(1, dtype=numpy.uint32)
+        gl.glGetProgramBinary(self._id, size, length, binary_format, binary)
+
+        # failing to store only means the next run compiles from source again
+        write_cache_file(path, binary_format.tobytes() + binary[:length[0]].tobytes())
+
     def _create(self):
         if self._id is None:
             self._id = gl.glCreateProgram()
 
+        cache_path = self._binary_cache_path()
+        self._from_binary_cache = self._load_binary(cache_path)
+        if self._from_binary_cache:
+            self._forget_uniform_values()
+            return True
+
         for shader in self._shaders:
             if shader.needs_compile:
                 shader.compile()
@@ -153,16 +323,33 @@ class ShaderProgram:
                 # One of the shaders did not compile correctly -> skip linking step
                 return False
 
-        return self._link_shader()
+        if cache_path is not None:
+            gl.glProgramParameteri(self._id, gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, gl.GL_TRUE)
+
+        linked = self._link_shader()
+        if linked and cache_path is not None:
+            self._store_binary(cache_path)
+        return linked
 
     def needs_recompile(self):
         for shader in self._shaders:
-            if shader.needs_compile:
+            if self._from_binary_cache:
+                # the shaders of a program loaded from the binary cache were never compiled
+                if shader.has_changed:
+                    return True
+            elif shader.needs_compile:
                 return True
         return False
 
     def activate(self):
-        gl.glUseProgram(self._id)
+        state.use_program(self._id)
+
+    def _forget_uniform_values(self):
+        # a (re)linked program starts with default uniform values and block bindings
+        for u in self._uniforms.values():
+            u['value'] = None
+        for name, binding in self._uniform_blocks.items():
+            self._bind_uniform_block(name, binding)
 
     def _link_shader(self):
         for shader in self._shaders:
@@ -182,14 +369,24 @@ class ShaderProgram:
             print(f'{log.decode("utf-8")}')
             print('-' * 20)
             return False
+        self._forget_uniform_values()
         return True
 
     def get_uniform_location(self, name):
         return gl.glGetUniformLocation(self._id, name)
 
     def set_uniform(self, name, value):
+        """Set a uniform on the active program. Unchanged values are not uploaded."""
         u = self._uniforms[name]
+        if u['value'] is not None and u['value'] == value:
+            state.skipped += 1
+            return
         u['fn'](u['loc'], value)
+        u['value'] = copy(value)
+        state.issued += 1
 
     def compile_and_link(self) -> bool:
-        return self._create()
+        start = time.perf_counter()
+        status = self._create()
+        self._build_time = time.perf_counter() - start
+        return status
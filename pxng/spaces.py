@@ -1,31 +1,60 @@
-from copy import copy
+from itertools import count
 
 import glm
 
+# every matrix state gets a unique version number
+_versions = count(1)
+
 
 class CoordinateSystem:
+    # All operations replace the matrix instead of modifying it in place, so
+    # the stack can hold references and push needs no copy.
 
-    def __init__(self):
+    def __init__(self, depth=32):
         self._m = glm.mat4x4(1)
-        self._stack = []
+        self._version = next(_versions)
+        self._stack = [None] * depth
+        self._top = 0
 
     def translate(self, vec3):
         self._m = glm.translate(self._m, vec3)
+        self._version = next(_versions)
 
     def scale(self, vec3):
         self._m = glm.scale(self._m, vec3)
+        self._version = next(_versions)
 
     def rotate(self, angle, vec3):
         self._m = glm.rotate(self._m, angle, vec3)
+        self._version = next(_versions)
 
     def push(self):
-        self._stack.insert(0, copy(self._m))
+        if self._top == len(self._stack):
+            self._stack.extend([None] * len(self._stack))
+        self._stack[self._top] = (self._m, self._version)
+        self._top += 1
 
     def load_identity(self):
         self._m = glm.mat4x4(1)
+        self._version = next(_versions)
 
     def pop(self):
-        self._m = self._stack.pop(0)
+        if self._top == 0:
+            raise UserWarning('Matrix stack underflow')
+        self._top -= 1
+        # restoring the version keeps products cached before the push valid
+        self._m, self._version = self._stack[self._top]
+        self._stack[self._top] = None
+
+    @property
+    def depth(self) -> int:
+        """Number of pushed matrices."""
+        return self._top
+
+    @property
+    def version(self) -> int:
+        """Changes whenever the matrix changes."""
+        return self._version
 
     @property
     def m(self):
@@ -33,7 +62,8 @@ class CoordinateSystem:
 
     @m.setter
     def m(self, m: glm.mat4x4):
-        self._m = m
+        self._m = glm.mat4x4(m)
+        self._version = next(_versions)
 
 
 class Spaces:
@@ -46,6 +76,7 @@ class Spaces:
         self._texture = CoordinateSystem()
         self._default_tint = glm.vec4(1)
         self._tint = self._default_tint
+        self._products = {}
 
     @property
     def projection(self) -> CoordinateSystem:
@@ -71,9 +102,29 @@ class Spaces:
     def height(self):
         return self._height
 
+    def _product(self, name, *systems: CoordinateSystem) -> glm.mat4x4:
+        versions = tuple(system.version for system in systems)
+        cached = self._products.get(name)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+
+        product = systems[0].m
+        for system in systems[1:]:
+            product = product * system.m
+        self._products[name] = (versions, product)
+        return product
+
     @property
     def projection_view(self) -> glm.mat4x4:
-        return self.projection.m * self.view.m
+        return self._product('projection_view', self._projection, self._view)
+
+    @property
+    def model_view(self) -> glm.mat4x4:
+        return self._product('model_view', self._view, self._model)
+
+    @property
+    def projection_view_model(self) -> glm.mat4x4:
+        return self._product('projection_view_model', self._projection, self._view, self._model)
 
     @property
     def tint(self) -> glm.vec4:
@@ -1,25 +1,34 @@
-from typing import Tuple
+from typing import List, Tuple
 
 import glm
 import imageio
+import numpy
 from numpy.core.multiarray import ndarray
 
 import pxng
 from pxng import resource
+from pxng.gl_state import state
+from pxng.gpu_timer import timer
+from pxng.render_stats import counters
 from OpenGL.GL import GL_TRIANGLES, GL_RGBA, GL_RGB, glGenTextures, \
-    GL_TEXTURE_RECTANGLE, glBindTexture, glTexParameteri, GL_TEXTURE_MAG_FILTER, \
-    GL_NEAREST, GL_TEXTURE_MIN_FILTER, glTexImage2D, GL_UNSIGNED_BYTE, glTexSubImage2D, \
-    GL_BLEND, glDisable, GL_RED, glPixelStorei, GL_UNPACK_ALIGNMENT, glGetInteger
+    GL_TEXTURE_RECTANGLE, glTexParameteri, GL_TEXTURE_MAG_FILTER, \
+    GL_NEAREST, GL_LINEAR, GL_TEXTURE_MIN_FILTER, glTexImage2D, GL_UNSIGNED_BYTE, glTexSubImage2D, \
+    GL_BLEND, glDisable, GL_RED, glPixelStorei, GL_UNPACK_ALIGNMENT, glGetInteger, \
+    glDeleteTextures
 
 
 class SpriteRectangle:
+    # the unit quad is the same for every sprite, so one instance is shared
+    _shared = None
+    _ref_count = 0
+
     def __init__(self):
-        program = pxng.ShaderProgram('SpriteShader')
-        program.add_shader(resource('shaders/sprite.vert'), pxng.ShaderType.Vertex)
-        program.add_shader(resource('shaders/sprite.frag'), pxng.ShaderType.Fragment)
-        program.compile_and_link()
+        program = pxng.ShaderProgram.acquire('SpriteShader', [
+            (resource('shaders/sprite.vert'), pxng.ShaderType.Vertex),
+            (resource('shaders/sprite.frag'), pxng.ShaderType.Fragment),
+        ])
 
-        program.add_uniform('projection_view', glm.mat4x4)
+        program.add_uniform_block('Matrices', pxng.MatrixBlock.binding)
         program.add_uniform('model', glm.mat4x4)
         program.add_uniform('texture_matrix', glm.mat4x4)
         program.add_uniform('color', glm.vec4)
@@ -44,22 +53,67 @@ class SpriteRectangle:
             glm.uvec2(1, 1)
         )
 
+    @classmethod
+    def acquire(cls) -> 'SpriteRectangle':
+        if cls._shared is None:
+            cls._shared = SpriteRectangle()
+        cls._ref_count += 1
+        return cls._shared
+
+    @classmethod
+    def release(cls):
+        cls._ref_count -= 1
+        if cls._ref_count <= 0 and cls._shared is not None:
+            cls._shared._vao.delete()
+            cls._shared._program.release()
+            cls._shared = None
+
+    @classmethod
+    def clear_shared(cls):
+        """Forget the shared instance without deleting it, e.g. after its context was destroyed."""
+        cls._shared = None
+        cls._ref_count = 0
+
     def draw(self, spaces: pxng.Spaces):
         if self._vao.bind():
             self._program.activate()
-            self._program.set_uniform('projection_view', spaces.projection_view)
             self._program.set_uniform('model', spaces.model.m)
             self._program.set_uniform('texture_matrix', spaces.texture.m)
             self._program.set_uniform('color', spaces.tint)
             self._program.set_uniform('sprite_texture', 0)
+            timer.begin('sprite')
             self._vao.draw()
+            timer.end()
 
 
 class Sprite:
-    def __init__(self, data: ndarray):
+    # more dirty rectangles than this are merged into their bounding box
+    max_dirty_rects = 8
+
+    def __init__(self, data: ndarray, streaming=False, buffer_count=2, filtered=False):
+        """
+        Creates a sprite from image data.
+
+        Parameters
+        ----------
+        data: ndarray
+            Image data with shape (height, width) or (height, width, components)
+        streaming: bool
+            Upload changes through a ring of pixel buffer objects. Use this for
+            sprites that are updated every frame, like software frame buffers.
+        buffer_count: int
+            Number of pixel buffers used when streaming.
+        filtered: bool
+            Sample the texture with linear filtering instead of nearest
+            neighbour, for data that is meant to be interpolated.
+        """
         self._data = data
         self._created = False
-        self._dirty = False
+        self._dirty_rects = []
+        self._streaming = streaming
+        self._buffer_count = buffer_count
+        self._filter = GL_LINEAR if filtered else GL_NEAREST
+        self._pixel_buffer = None
         self._texid = None
         self._width = data.shape[1]
         self._height = data.shape[0]
@@ -84,14 +138,80 @@ class Sprite:
     def height(self):
         return self._height
 
+    @property
+    def data(self) -> ndarray:
+        return self._data
+
+    @property
+    def streaming(self):
+        return self._streaming
+
+    @property
+    def dirty_rects(self) -> List[Tuple[int, int, int, int]]:
+        """The regions (x0, y0, x1, y1) that will be uploaded on the next activation."""
+        return [tuple(rect) for rect in self._dirty_rects]
+
+    def _mark_dirty(self, x0, y0, x1, y1):
+        x0 = max(x0, 0)
+        y0 = max(y0, 0)
+        x1 = min(x1, self._width)
+        y1 = min(y1, self._height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        rects = self._dirty_rects
+        if rects:
+            last = rects[-1]
+            if x0 <= last[2] and last[0] <= x1 and y0 <= last[3] and last[1] <= y1:
+                # touches or overlaps the previous region -> grow that one instead
+                last[0] = min(last[0], x0)
+                last[1] = min(last[1], y0)
+                last[2] = max(last[2], x1)
+                last[3] = max(last[3], y1)
+                return
+
+        rects.append([x0, y0, x1, y1])
+        if len(rects) > self.max_dirty_rects:
+            x0 = min(rect[0] for rect in rects)
+            y0 = min(rect[1] for rect in rects)
+            x1 = max(rect[2] for rect in rects)
+            y1 = max(rect[3] for rect in rects)
+            self._dirty_rects = [[x0, y0, x1, y1]]
+
     def set_pixel(self, x, y, color: Tuple[int, int, int]):
         self._data[y, x] = color
-        self._dirty = True
+        # negative coordinates index from the far edge, like numpy does
+        x %= self._width
+        y %= self._height
+        self._mark_dirty(x, y, x + 1, y + 1)
 
-    def _set_unpack_alignment(self):
+    def set_pixels(self, xs, ys, colors):
+        """
+        Set many pixels at once.
+
+        Parameters
+        ----------
+        xs: array_like
+            x coordinates of the pixels, negative values count from the right edge
+        ys: array_like
+            y coordinates of the pixels, negative values count from the bottom edge
+        colors: array_like
+            A single color or one color per pixel
+        """
+        xs = numpy.asarray(xs, dtype=numpy.intp)
+        ys = numpy.asarray(ys, dtype=numpy.intp)
+        if xs.size == 0:
+            return
+        self._data[ys, xs] = colors
+        # the write raised IndexError for coordinates out of range, the rest wraps like in numpy
+        xs = xs % self._width
+        ys = ys % self._height
+        self._mark_dirty(int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+
+    def _set_unpack_alignment(self, width):
         self._unpack_alignment = glGetInteger(GL_UNPACK_ALIGNMENT)
-        if self._width % 2 == 1 or self._width % 4 == 2:
-            # Odd sized texture
+        if (width * self._components) % 4 != 0:
+            # rows are not 4 byte aligned
             glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
 
     def _reset_unpack_alignment(self):
@@ -99,53 +219,98 @@ class Sprite:
 
     def _create(self):
         self._texid = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_RECTANGLE, self._texid)
+        state.bind_texture(GL_TEXTURE_RECTANGLE, self._texid)
 
-        glTexParameteri(GL_TEXTURE_RECTANGLE, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-        glTexParameteri(GL_TEXTURE_RECTANGLE, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_RECTANGLE, GL_TEXTURE_MAG_FILTER, self._filter)
+        glTexParameteri(GL_TEXTURE_RECTANGLE, GL_TEXTURE_MIN_FILTER, self._filter)
 
         d = self._data
         w = self._width
         h = self._height
         fmt = self._format
 
-        self._set_unpack_alignment()
+        self._set_unpack_alignment(w)
         glTexImage2D(GL_TEXTURE_RECTANGLE, 0, fmt, w, h, 0, fmt, GL_UNSIGNED_BYTE, d)
+        counters.bytes_uploaded += d.nbytes
         self._reset_unpack_alignment()
 
-        self._rect = SpriteRectangle()
+        if self._streaming:
+            self._pixel_buffer = pxng.PixelBuffer(self._buffer_count)
+
+        self._rect = SpriteRectangle.acquire()
+        self._dirty_rects = []
         self._created = True
 
+    def delete(self):
+        """Free the GL resources of the sprite. It is recreated if drawn again."""
+        if not self._created:
+            return
+        glDeleteTextures(1, [self._texid])
+        state.invalidate()
+        self._texid = None
+        self._rect = None
+        SpriteRectangle.release()
+        if self._pixel_buffer is not None:
+            self._pixel_buffer.delete()
+            self._pixel_buffer = None
+        self._created = False
+
+    def _stream(self):
+        # a single upload of the bounding box keeps one transfer per buffer and frame
+        rects = self._dirty_rects
+        x0 = min(rect[0] for rect in rects)
+        y0 = min(rect[1] for rect in rects)
+        x1 = max(rect[2] for rect in rects)
+        y1 = max(rect[3] for rect in rects)
+        d = numpy.ascontiguousarray(self._data[y0:y1, x0:x1])
+        w = x1 - x0
+        h = y1 - y0
+
+        self._set_unpack_alignment(w)
+        self._pixel_buffer.upload(GL_TEXTURE_RECTANGLE, d, x0, y0, w, h, self._format)
+        self._reset_unpack_alignment()
+
     def _update(self):
-        glBindTexture(GL_TEXTURE_RECTANGLE, self._texid)
+        state.bind_texture(GL_TEXTURE_RECTANGLE, self._texid)
+
+        if self._streaming:
+            self._stream()
+            self._dirty_rects = []
+            return
 
-        d = self._data
-        w = self._width
-        h = self._height
         fmt = self._format
+        for x0, y0, x1, y1 in self._dirty_rects:
+            d = numpy.ascontiguousarray(self._data[y0:y1, x0:x1])
+            w = x1 - x0
+            h = y1 - y0
 
-        self._set_unpack_alignment()
-        glTexSubImage2D(GL_TEXTURE_RECTANGLE, 0, 0, 0, w, h, fmt, GL_UNSIGNED_BYTE, d)
-        self._reset_unpack_alignment()
+            self._set_unpack_alignment(w)
+            glTexSubImage2D(GL_TEXTURE_RECTANGLE, 0, x0, y0, w, h, fmt, GL_UNSIGNED_BYTE, d)
+            counters.bytes_uploaded += d.nbytes
+            self._reset_unpack_alignment()
 
-        self._updated = True
+        self._dirty_rects = []
 
     def update(self):
-        self._dirty = True
+        """Upload the complete image on the next activation."""
+        self._dirty_rects = [[0, 0, self._width, self._height]]
+
+    def update_region(self, x, y, width, height):
+        """Upload a sub region of the image on the next activation."""
+        self._mark_dirty(x, y, x + width, y + height)
 
     def activate(self):
         if not self._created:
             self._create()
 
-        if self._dirty:
+        if self._dirty_rects:
             self._update()
 
-        glBindTexture(GL_TEXTURE_RECTANGLE, self._texid)
-        glTexParameteri(GL_TEXTURE_RECTANGLE, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-        glTexParameteri(GL_TEXTURE_RECTANGLE, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        # the filter parameters are texture state and were set in _create
+        state.bind_texture(GL_TEXTURE_RECTANGLE, self._texid)
 
     def deactivate(self):
-        glBindTexture(GL_TEXTURE_RECTANGLE, 0)
+        state.bind_texture(GL_TEXTURE_RECTANGLE, 0)
 
     def _pre_draw(self, spaces: pxng.Spaces):
         self.activate()
@@ -153,7 +318,7 @@ class Sprite:
         spaces.texture.push()
 
     def _post_draw(self, spaces: pxng.Spaces):
-        self.deactivate()
+        # the texture stays bound: the next draw of the same sprite skips the bind
         spaces.model.pop()
         spaces.texture.pop()
 
@@ -201,6 +366,27 @@ class Sprite:
 
         self._post_draw(spaces)
 
+    def draw_batched(self, batch: 'pxng.SpriteBatch', spaces: pxng.Spaces):
+        """
+        Add the sprite at the current position to a sprite batch.
+
+        Parameters
+        ----------
+        batch : pxng.SpriteBatch
+            the batch that collects the sprite quad
+        spaces : pxng.Spaces
+            the current coordinate systems
+        """
+        batch.draw(spaces, self, 0, 0, self._width, self._height)
+
+    def draw_partial_batched(self, batch: 'pxng.SpriteBatch', spaces: pxng.Spaces,
+                             x, y, width, height):
+        """
+        Add a partial sprite to a sprite batch. See *draw_partial* for the
+        meaning of the coordinates.
+        """
+        batch.draw(spaces, self, x, y, width, height)
+
     @classmethod
     def create_from_image(cls, path):
         img_data = imageio.imread(path)
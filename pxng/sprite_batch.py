@@ -0,0 +1,121 @@
+import glm
+import numpy
+from OpenGL.GL import GL_TRIANGLES
+
+import pxng
+from pxng import resource
+from pxng.gpu_timer import timer
+from pxng.render_stats import counters
+
+
+class SpriteBatch:
+    def __init__(self):
+        """
+        Collects sprite quads that share a texture and draws them with a
+        single draw call. The batch is flushed automatically when a sprite
+        with another texture is added.
+        """
+        program = pxng.ShaderProgram.acquire('SpriteBatchShader', [
+            (resource('shaders/sprite_batch.vert'), pxng.ShaderType.Vertex),
+            (resource('shaders/sprite.frag'), pxng.ShaderType.Fragment),
+        ])
+
+        program.add_uniform_block('Matrices', pxng.MatrixBlock.binding)
+        program.add_uniform('sprite_texture', glm.ivec1)
+        self._program = program
+
+        self._vao = pxng.VertexArrayObject(GL_TRIANGLES)
+        self._positions = pxng.BufferObject(data_type=glm.vec3)
+        self._texture_coords = pxng.BufferObject(data_type=glm.vec2)
+        self._colors = pxng.BufferObject(data_type=glm.vec4)
+        self._vao.attach_buffer(self._positions)  # vertex buffer
+        self._vao.attach_buffer(self._texture_coords)  # texture buffer
+        self._vao.attach_buffer(self._colors)  # color buffer
+
+        self._sprite = None
+        self._records = []
+        self._started = False
+
+    def start_batch(self):
+        self._records.clear()
+        self._started = True
+
+    def check_started(self):
+        if not self._started:
+            self.start_batch()
+
+    def draw(self, spaces: pxng.Spaces, sprite: pxng.Sprite, x, y, width, height):
+        """
+        Add a (partial) sprite to the batch. The quad is placed with the
+        current model matrix, exactly like *Sprite.draw_partial*.
+
+        Parameters
+        ----------
+        spaces: pxng.Spaces
+            the current coordinate systems
+        sprite: pxng.Sprite
+            the sprite that owns the texture
+        x: int
+            x coordinate of the sub region in pixel space
+        y: int
+            y coordinate of the sub region in pixel space
+        width: int
+            width of the sub region in number of pixels
+        height: int
+            height of the sub region in number of pixels
+        """
+        if sprite is not self._sprite:
+            self.draw_batch_if_started(spaces)
+            self._sprite = sprite
+        self.check_started()
+
+        m = spaces.model.m
+        o = m[3]
+        ax = m[0] * width
+        ay = m[1] * height
+        t = spaces.tint
+        self._records.append((o.x, o.y, o.z, ax.x, ax.y, ax.z, ay.x, ay.y, ay.z,
+                              x, y, width, height, t.x, t.y, t.z, t.w))
+
+    def _build(self):
+        records = numpy.array(self._records, dtype=numpy.float32)
+        count = records.shape[0]
+        o = records[:, numpy.newaxis, 0:3]
+        ax = records[:, numpy.newaxis, 3:6]
+        ay = records[:, numpy.newaxis, 6:9]
+
+        # same corner order as the unit quad of SpriteRectangle
+        u = numpy.array([0, 0, 1, 1], dtype=numpy.float32)[numpy.newaxis, :, numpy.newaxis]
+        v = numpy.array([1, 0, 0, 1], dtype=numpy.float32)[numpy.newaxis, :, numpy.newaxis]
+        positions = o + u * ax + v * ay
+
+        texture_coords = numpy.empty((count, 4, 2), dtype=numpy.float32)
+        texture_coords[:, :, 0] = records[:, 9:10] + u[..., 0] * records[:, 11:12]
+        texture_coords[:, :, 1] = records[:, 10:11] + v[..., 0] * records[:, 12:13]
+
+        self._vao.reset()
+        self._vao.add_quads(positions)
+        self._texture_coords.extend(texture_coords)
+        self._colors.extend(numpy.repeat(records[:, 13:17], 4, axis=0))
+
+    def draw_batch(self, spaces: pxng.Spaces):
+        self._started = False
+        if not self._records:
+            return
+
+        self._build()
+        self._records.clear()
+
+        if self._vao.bind():
+            self._sprite.activate()
+            program = self._program
+            program.activate()
+            program.set_uniform('sprite_texture', 0)
+            timer.begin('sprite')
+            self._vao.draw()
+            timer.end()
+
+    def draw_batch_if_started(self, spaces):
+        if self._started:
+            counters.batch_flushes += 1
+            self.draw_batch(spaces)
@@ -0,0 +1,61 @@
+from typing import Optional
+
+import pxng
+from pxng.text_renderer import GlyphBuffer
+
+
+class Text:
+    def __init__(self, text=''):
+        """
+        A retained line of text. The glyph buffer is built on the first draw
+        and only rebuilt when *text* changes, so drawing an unchanged label is
+        a bind and a single draw call.
+
+        Parameters
+        ----------
+        text: str
+            The text to show.
+        """
+        self._text = text
+        self._glyphs: Optional[GlyphBuffer] = None
+        self._dirty = True
+        self._evictions = None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @text.setter
+    def text(self, text: str):
+        if text != self._text:
+            self._text = text
+            self._dirty = True
+
+    def glyphs(self, font: pxng.Font, instanced=False) -> GlyphBuffer:
+        """
+        Returns the glyph buffer for *font*, rebuilding it if the text changed
+        or glyphs were evicted from the font atlas.
+        """
+        if self._glyphs is not None and self._glyphs.instanced != instanced:
+            # drawn by a renderer with another backend
+            self.delete()
+
+        if self._glyphs is None:
+            self._glyphs = GlyphBuffer(instanced)
+
+        if self._dirty or self._evictions != font.evictions:
+            # evicted glyphs may have left stale atlas slots in the buffer
+            self._glyphs.set_text(self._text, font)
+            self._evictions = font.evictions
+            self._dirty = False
+        return self._glyphs
+
+    def delete(self):
+        """Free the glyph buffer. It is recreated if the text is drawn again."""
+        if self._glyphs is not None:
+            self._glyphs.delete()
+            self._glyphs = None
+            self._dirty = True
+
+    def __str__(self):
+        return self._text
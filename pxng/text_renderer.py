@@ -1,75 +1,295 @@
 import glm
+import numpy
 
-from OpenGL.GL import GL_ARRAY_BUFFER, glGenVertexArrays, glBindVertexArray, \
-    glDrawArrays, GL_POINTS
+from OpenGL.GL import GL_ARRAY_BUFFER, glGenVertexArrays, glDeleteVertexArrays, \
+    glDrawArrays, GL_POINTS, glDrawArraysInstanced, GL_TRIANGLE_STRIP, glGetString, GL_RENDERER
 
 import pxng
+from pxng.gl_state import state
+from pxng.gpu_timer import timer
+from pxng.render_stats import counters
 
+# renderers where geometry shaders are emulated slowly on the CPU
+_SOFTWARE_RENDERERS = ('llvmpipe', 'softpipe', 'swiftshader')
 
-class FontRenderer:
-    def __init__(self):
+
+def glyph_codes(text: str) -> numpy.ndarray:
+    """Returns the code points of *text* as an uint32 array."""
+    return numpy.frombuffer(text.encode('utf-32-le'), dtype=numpy.uint32)
+
+
+def preferred_text_backend() -> str:
+    """
+    Returns 'instanced' on software renderers and 'geometry' otherwise.
+    Needs a current OpenGL context.
+    """
+    renderer = (glGetString(GL_RENDERER) or b'').decode('utf-8', 'replace').lower()
+    if any(name in renderer for name in _SOFTWARE_RENDERERS):
+        return 'instanced'
+    return 'geometry'
+
+
+class GlyphBuffer:
+    def __init__(self, instanced=False):
+        """
+        Glyph positions and codes in their own vertex array.
+
+        Parameters
+        ----------
+        instanced: bool
+            Advance the attributes once per instance instead of once per
+            vertex, for the instanced quad backend.
+        """
+        divisor = 1 if instanced else 0
+        self._instanced = instanced
         self._vao = glGenVertexArrays(1)
-        self._points = pxng.BufferObject(data_type=glm.vec3, array_type=GL_ARRAY_BUFFER)
-        self._chars = pxng.BufferObject(data_type=glm.uvec1, array_type=GL_ARRAY_BUFFER)
+        self._points = pxng.BufferObject(data_type=glm.vec3, array_type=GL_ARRAY_BUFFER, divisor=divisor)
+        self._chars = pxng.BufferObject(data_type=glm.uvec1, array_type=GL_ARRAY_BUFFER, divisor=divisor)
+        self._basis = pxng.BufferObject(data_type=glm.vec4, array_type=GL_ARRAY_BUFFER, divisor=divisor)
+        self._colors = pxng.BufferObject(data_type=glm.vec4, array_type=GL_ARRAY_BUFFER, divisor=divisor)
 
-        program = pxng.ShaderProgram('FontShader')
-        program.add_shader(pxng.resource('shaders/font.vert'), pxng.ShaderType.Vertex)
-        program.add_shader(pxng.resource('shaders/font.geom'), pxng.ShaderType.Geometry)
-        program.add_shader(pxng.resource('shaders/font.frag'), pxng.ShaderType.Fragment)
-        program.compile_and_link()
+    @property
+    def instanced(self):
+        return self._instanced
 
-        program.add_uniform('projection_view', glm.mat4x4)
-        program.add_uniform('model', glm.mat4x4)
-        program.add_uniform('color', glm.vec4)
-        program.add_uniform('size', glm.uvec1)
-        program.add_uniform('sprite_texture', glm.ivec1)
-        self._program = program
+    def __len__(self):
+        return len(self._points)
 
-    def add_char(self, pos: glm.vec3, char: int):
+    def add_char(self, pos: glm.vec3, char: int, basis=glm.vec4(1, 0, 0, 1), color=glm.vec4(1)):
         self._points.set_value(pos)
         self._chars.set_value(glm.uvec1(char))
+        self._basis.set_value(basis)
+        self._colors.set_value(color)
+
+    def add_glyphs(self, points, codes, basis, colors):
+        """
+        Append many glyphs at once.
+
+        Parameters
+        ----------
+        points: numpy.ndarray
+            (n, 3) glyph origins
+        codes: numpy.ndarray
+            (n,) glyph slots in the font atlas
+        basis: array_like
+            The glyph x and y axes as (x.x, x.y, y.x, y.y), either one for all
+            glyphs or one per glyph.
+        colors: array_like
+            One RGBA color for all glyphs or one per glyph.
+        """
+        count = len(codes)
+        self._points.extend(points)
+        self._chars.extend(codes)
+        self._basis.extend(numpy.broadcast_to(numpy.asarray(basis, dtype=numpy.float32), (count, 4)))
+        self._colors.extend(numpy.broadcast_to(numpy.asarray(colors, dtype=numpy.float32), (count, 4)))
+
+    def set_text(self, text: str, font: pxng.Font):
+        """Replace the content with a single line of text."""
+        self.reset()
+        slots = font.glyph_slots(glyph_codes(text))
+        points = numpy.zeros((len(slots), 3), dtype=numpy.float32)
+        points[:, 0] = numpy.arange(len(slots)) * font.glyph_width
+        self.add_glyphs(points, slots, (1, 0, 0, 1), (1, 1, 1, 1))
 
     def reset(self):
         self._points.reset()
         self._chars.reset()
+        self._basis.reset()
+        self._colors.reset()
+
+    def bind(self):
+        state.bind_vertex_array(self._vao)
+        return (self._points.bind(0) and self._chars.bind(1) and
+                self._basis.bind(2) and self._colors.bind(3))
+
+    def delete(self):
+        self._points.delete()
+        self._chars.delete()
+        self._basis.delete()
+        self._colors.delete()
+        glDeleteVertexArrays(1, [self._vao])
+        state.invalidate()
+
+
+class FontRenderer:
+    def __init__(self, sdf=False, instanced=False):
+        """
+        Parameters
+        ----------
+        sdf: bool
+            Use the fragment shader for distance field fonts.
+        instanced: bool
+            Draw every glyph as an instance of a quad instead of expanding
+            points to quads in a geometry shader.
+        """
+        name = 'FontSdf' if sdf else 'Font'
+        fragment_shader = 'shaders/font_sdf.frag' if sdf else 'shaders/font.frag'
+
+        if instanced:
+            name += 'InstancedShader'
+            shaders = [
+                (pxng.resource('shaders/font_instanced.vert'), pxng.ShaderType.Vertex),
+                (pxng.resource(fragment_shader), pxng.ShaderType.Fragment),
+            ]
+        else:
+            name += 'Shader'
+            shaders = [
+                (pxng.resource('shaders/font.vert'), pxng.ShaderType.Vertex),
+                (pxng.resource('shaders/font.geom'), pxng.ShaderType.Geometry),
+                (pxng.resource(fragment_shader), pxng.ShaderType.Fragment),
+            ]
+
+        self._instanced = instanced
+        program = pxng.ShaderProgram.acquire(name, shaders)
+
+        program.add_uniform_block('Matrices', pxng.MatrixBlock.binding)
+        program.add_uniform('model', glm.mat4x4)
+        program.add_uniform('color', glm.vec4)
+        program.add_uniform('glyph_size', glm.ivec2)
+        program.add_uniform('cell_size', glm.ivec2)
+        program.add_uniform('sprite_texture', glm.ivec1)
+        self._program = program
 
-    def draw(self, spaces):
-        glBindVertexArray(self._vao)
-        if self._points.bind(0) and self._chars.bind(1):
+    def draw(self, model: glm.mat4, color: glm.vec4, font: pxng.Font, glyphs: GlyphBuffer):
+        if glyphs.bind():
             self._program.activate()
-            self._program.set_uniform('projection_view', spaces.projection_view)
-            self._program.set_uniform('model', spaces.model.m)
-            self._program.set_uniform('color', spaces.tint)
-            # self._program.set_uniform('size', 8)
+            self._program.set_uniform('model', model)
+            self._program.set_uniform('color', color)
+            self._program.set_uniform('glyph_size', glm.ivec2(font.glyph_width, font.glyph_height))
+            self._program.set_uniform('cell_size', glm.ivec2(font.cell_width, font.cell_height))
             self._program.set_uniform('sprite_texture', 0)
 
-            glDrawArrays(GL_POINTS, 0, len(self._points))
-
-        glBindVertexArray(0)
+            timer.begin('text')
+            if self._instanced:
+                glDrawArraysInstanced(GL_TRIANGLE_STRIP, 0, 4, len(glyphs))
+                counters.vertices += 4 * len(glyphs)
+            else:
+                glDrawArrays(GL_POINTS, 0, len(glyphs))
+                counters.vertices += len(glyphs)
+            timer.end()
+            counters.draw_calls += 1
 
 
 class TextRenderer:
-    def __init__(self, font: pxng.Font):
+    backends = ('auto', 'geometry', 'instanced')
+
+    def __init__(self, font: pxng.Font, backend='auto'):
+        """
+        Draws text with a bitmap font. Immediate mode strings are collected
+        into a single glyph batch that is drawn with one call when the window
+        flushes its batches. Every glyph carries its own transformed origin,
+        axes and tint so strings with different positions, scales, angles and
+        colors still share the draw.
+
+        With a distance field font (*Font(..., sdf=True)*) the atlas is
+        sampled with linear filtering and text stays sharp at any scale.
+
+        Parameters
+        ----------
+        font: pxng.Font
+            The font to draw with.
+        backend: str
+            'geometry' expands glyph points to quads in a geometry shader,
+            'instanced' draws instanced quads and avoids the geometry stage,
+            which is slow on software renderers. 'auto' picks 'instanced' on
+            software renderers and 'geometry' otherwise.
+        """
+        if backend not in self.backends:
+            raise UserWarning(f'Unknown text backend: {backend}')
+        if backend == 'auto':
+            backend = preferred_text_backend()
+
         self._font = font
-        self._font_sprite = pxng.Sprite(self._font._font_data)
-        self._renderer = FontRenderer()
+        self._backend = backend
+        self._instanced = backend == 'instanced'
+        self._font_sprite = pxng.Sprite(font.data, filtered=font.sdf)
+        self._renderer = FontRenderer(sdf=font.sdf, instanced=self._instanced)
+        self._glyphs = GlyphBuffer(self._instanced)
+        self._batch = GlyphBuffer(self._instanced)
+        self._started = False
 
-    def draw_string(self, spaces: pxng.Spaces, x, y, text, scale=1.0, angle=0):
-        self._renderer.reset()
+    @property
+    def font(self) -> pxng.Font:
+        return self._font
+
+    @property
+    def backend(self) -> str:
+        """The text backend in use, 'geometry' or 'instanced'."""
+        return self._backend
+
+    def start_batch(self):
+        self._batch.reset()
+        self._started = True
+
+    def check_started(self):
+        if not self._started:
+            self.start_batch()
+
+    def add_string(self, spaces: pxng.Spaces, x, y, text, scale=1.0, angle=0):
+        """
+        Add a string to the current batch. The model transform, scale,
+        rotation and tint are resolved here, on the CPU, once per string.
+        """
+        codes = glyph_codes(text)
+        if len(codes) == 0:
+            return
+        slots = self._font.glyph_slots(codes)
+
+        m = glm.translate(spaces.model.m, glm.vec3(x, y, 1))
+        m = glm.scale(m, glm.vec3(scale, scale, 1))
+        m = glm.rotate(m, glm.radians(angle), glm.vec3(0, 0, 1))
+
+        x_axis = numpy.array(m[0].xyz, dtype=numpy.float32)
+        origin = numpy.array(m[3].xyz, dtype=numpy.float32)
+        steps = numpy.arange(len(slots), dtype=numpy.float32) * self._font.glyph_width
+        points = origin + steps[:, numpy.newaxis] * x_axis
+
+        basis = (m[0].x, m[0].y, m[1].x, m[1].y)
+        self._batch.add_glyphs(points, slots, basis, spaces.tint)
+
+    def _activate_font(self):
+        font = self._font
+        if font.data is not self._font_sprite.data:
+            # a glyph page was added, the texture has a new size
+            font.take_dirty_regions()
+            self._font_sprite.delete()
+            self._font_sprite = pxng.Sprite(font.data, filtered=font.sdf)
+        else:
+            for x, y, width, height in font.take_dirty_regions():
+                self._font_sprite.update_region(x, y, width, height)
         self._font_sprite.activate()
 
-        angle = glm.radians(angle)
+    def draw_batch(self, spaces: pxng.Spaces):
+        if len(self._batch) > 0:
+            self._activate_font()
+            self._renderer.draw(glm.mat4(), glm.vec4(1), self._font, self._batch)
+        self._font.release_glyphs()
+        self._started = False
+
+    def draw_batch_if_started(self, spaces: pxng.Spaces):
+        if self._started:
+            counters.batch_flushes += 1
+            self.draw_batch(spaces)
 
-        dx = self._font.glyph_width
-        for i, c in enumerate(text):
-            self._renderer.add_char(glm.vec3(i * dx, 0, 0), ord(c))
+    def _draw_glyphs(self, spaces: pxng.Spaces, glyphs: GlyphBuffer, x, y, scale, angle):
+        self._activate_font()
 
         spaces.model.push()
         spaces.model.translate((x, y, 1))
         spaces.model.scale((scale, scale, 1))
-        spaces.model.rotate(angle, (0, 0, 1))
+        spaces.model.rotate(glm.radians(angle), (0, 0, 1))
 
-        self._renderer.draw(spaces)
+        self._renderer.draw(spaces.model.m, spaces.tint, self._font, glyphs)
 
         spaces.model.pop()
-        self._font_sprite.deactivate()
+        if not self._started:
+            self._font.release_glyphs()
+
+    def draw_string(self, spaces: pxng.Spaces, x, y, text, scale=1.0, angle=0):
+        """Draw a string right away with its own draw call."""
+        self._glyphs.set_text(text, self._font)
+        self._draw_glyphs(spaces, self._glyphs, x, y, scale, angle)
+
+    def draw_text(self, spaces: pxng.Spaces, x, y, text: 'pxng.Text', scale=1.0, angle=0):
+        """Draw a retained text object. Its glyphs are only rebuilt when the text changed."""
+        self._draw_glyphs(spaces, text.glyphs(self._font, self._instanced), x, y, scale, angle)
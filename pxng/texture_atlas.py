@@ -0,0 +1,224 @@
+from typing import List, Optional, Tuple
+
+import numpy
+from numpy.core.multiarray import ndarray
+
+import pxng
+from pxng._utils import as_rgba
+
+
+class _SkylinePacker:
+    """Bottom-left skyline rectangle packer."""
+
+    def __init__(self, width, height):
+        self._width = width
+        self._height = height
+        self._skyline = [[0, 0, width]]  # segments of [x, y, width]
+        self._used_area = 0
+
+    @property
+    def used_area(self):
+        return self._used_area
+
+    def _fit(self, index, width, height):
+        x, y, _ = self._skyline[index]
+        if x + width > self._width:
+            return None
+
+        width_left = width
+        i = index
+        while width_left > 0:
+            y = max(y, self._skyline[i][1])
+            if y + height > self._height:
+                return None
+            width_left -= self._skyline[i][2]
+            i += 1
+        return y
+
+    def _add_level(self, index, x, y, width, height):
+        skyline = self._skyline
+        skyline.insert(index, [x, y + height, width])
+
+        i = index + 1
+        while i < len(skyline):
+            previous = skyline[i - 1]
+            segment = skyline[i]
+            shrink = previous[0] + previous[2] - segment[0]
+            if shrink <= 0:
+                break
+            segment[0] += shrink
+            segment[2] -= shrink
+            if segment[2] > 0:
+                break
+            del skyline[i]
+
+        i = 0
+        while i < len(skyline) - 1:
+            if skyline[i][1] == skyline[i + 1][1]:
+                skyline[i][2] += skyline[i + 1][2]
+                del skyline[i + 1]
+            else:
+                i += 1
+
+    def insert(self, width, height) -> Optional[Tuple[int, int]]:
+        best_index = None
+        best_top = None
+        best_width = None
+        for index, (x, _, segment_width) in enumerate(self._skyline):
+            y = self._fit(index, width, height)
+            if y is None:
+                continue
+            top = y + height
+            if best_top is None or top < best_top or \
+                    (top == best_top and segment_width < best_width):
+                best_index = index
+                best_top = top
+                best_width = segment_width
+
+        if best_index is None:
+            return None
+
+        x = self._skyline[best_index][0]
+        y = best_top - height
+        self._add_level(best_index, x, y, width, height)
+        self._used_area += width * height
+        return x, y
+
+
+class AtlasSprite:
+    def __init__(self, page: pxng.Sprite, x, y, width, height):
+        """
+        A sub region of a texture atlas page. It can be drawn everywhere a
+        *pxng.Sprite* can be drawn.
+        """
+        self._page = page
+        self._x = x
+        self._y = y
+        self._width = width
+        self._height = height
+
+    @property
+    def page(self) -> pxng.Sprite:
+        return self._page
+
+    @property
+    def x(self):
+        return self._x
+
+    @property
+    def y(self):
+        return self._y
+
+    @property
+    def width(self):
+        return self._width
+
+    @property
+    def height(self):
+        return self._height
+
+    @property
+    def data(self) -> ndarray:
+        return self._page.data[self._y:self._y + self._height, self._x:self._x + self._width]
+
+    def set_pixel(self, x, y, color):
+        self._page.set_pixel(self._x + x, self._y + y, color)
+
+    def draw(self, spaces: pxng.Spaces):
+        self._page.draw_partial(spaces, self._x, self._y, self._width, self._height)
+
+    def draw_partial(self, spaces: pxng.Spaces, x, y, width, height):
+        self._page.draw_partial(spaces, self._x + x, self._y + y, width, height)
+
+    def draw_batched(self, batch: pxng.SpriteBatch, spaces: pxng.Spaces):
+        batch.draw(spaces, self._page, self._x, self._y, self._width, self._height)
+
+    def draw_partial_batched(self, batch: pxng.SpriteBatch, spaces: pxng.Spaces,
+                             x, y, width, height):
+        batch.draw(spaces, self._page, self._x + x, self._y + y, width, height)
+
+
+class TextureAtlas:
+    def __init__(self, width=1024, height=1024, padding=1):
+        """
+        Packs many images into a few large RGBA textures (pages) so sprites
+        drawn from the same page can share a sprite batch.
+
+        Parameters
+        ----------
+        width: int
+            Width of a page in pixels.
+        height: int
+            Height of a page in pixels.
+        padding: int
+            Number of empty pixels between packed images.
+        """
+        self._width = width
+        self._height = height
+        self._padding = padding
+        self._pages: List[pxng.Sprite] = []
+        self._packers: List[_SkylinePacker] = []
+        self._image_area = 0
+
+    @property
+    def pages(self) -> List[pxng.Sprite]:
+        return self._pages
+
+    @property
+    def page_count(self):
+        return len(self._pages)
+
+    @property
+    def efficiency(self) -> float:
+        """The fraction of the allocated page area covered by images."""
+        if not self._pages:
+            return 0.0
+        return self._image_area / (self._width * self._height * len(self._pages))
+
+    def _add_page(self):
+        data = numpy.zeros((self._height, self._width, 4), dtype=numpy.uint8)
+        self._pages.append(pxng.Sprite(data))
+        self._packers.append(_SkylinePacker(self._width, self._height))
+
+    def add(self, image):
+        """
+        Add an image to the atlas.
+
+        Parameters
+        ----------
+        image: pxng.Sprite, pxng.AnimatedSprite or ndarray
+            The image data to pack. An AnimatedSprite is re-targeted to use
+            the packed copy of its sprite sheet.
+
+        Returns
+        -------
+        AtlasSprite or pxng.AnimatedSprite
+            A handle to the packed image, or the re-targeted AnimatedSprite.
+        """
+        if isinstance(image, pxng.AnimatedSprite):
+            image.sprite = self.add(image.sprite)
+            return image
+
+        if isinstance(image, (pxng.Sprite, AtlasSprite)):
+            image = image.data
+        rgba = as_rgba(image)
+        height, width = rgba.shape[:2]
+
+        padding = self._padding
+        if width + padding > self._width or height + padding > self._height:
+            raise UserWarning(f'Image of size {width}x{height} does not fit in the atlas')
+
+        for page, packer in zip(self._pages, self._packers):
+            position = packer.insert(width + padding, height + padding)
+            if position is not None:
+                break
+        else:
+            self._add_page()
+            page = self._pages[-1]
+            position = self._packers[-1].insert(width + padding, height + padding)
+
+        x, y = position
+        page.data[y:y + height, x:x + width] = rgba
+        page.update_region(x, y, width, height)
+        self._image_area += width * height
+        return AtlasSprite(page, x, y, width, height)
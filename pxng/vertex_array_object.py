@@ -1,7 +1,11 @@
 from typing import List
 
 import glm
+import numpy
+
 import pxng
+from pxng.gl_state import state
+from pxng.render_stats import counters
 
 import OpenGL.GL as gl
 
@@ -24,26 +28,57 @@ class VertexArrayObject:
         self._buffers[0].set_value(p2)
         self._buffers[0].set_value(p3)
         self._buffers[0].set_value(p4)
-        self._indices.set_value(glm.u16vec3(i, i + 1, i + 3))
-        self._indices.set_value(glm.u16vec3(i + 1, i + 2, i + 3))
+        self._indices.set_value(glm.uvec3(i, i + 1, i + 3))
+        self._indices.set_value(glm.uvec3(i + 1, i + 2, i + 3))
+
+    def add_quads(self, positions, colors=None, target=1):
+        """
+        Add many quads at once.
+
+        Parameters
+        ----------
+        positions: array_like
+            Vertex positions with shape (n, 4, 3). The corners of each quad
+            are in the same order as for *add_quad*.
+        colors: array_like
+            Optional colors with shape (n, 4) (one color per quad) or
+            (n, 4, 4) (one color per vertex).
+        target: int
+            The buffer that receives the colors.
+        """
+        positions = numpy.asarray(positions, dtype=numpy.float32).reshape(-1, 4, 3)
+        count = positions.shape[0]
+        i = self._buffers[0].extend(positions)
+
+        base = numpy.arange(i, i + 4 * count, 4, dtype=numpy.uint32)[:, numpy.newaxis]
+        indices = numpy.empty((count, 2, 3), dtype=numpy.uint32)
+        indices[:, 0] = base + (0, 1, 3)
+        indices[:, 1] = base + (1, 2, 3)
+        self._indices.extend(indices)
+
+        if colors is not None:
+            colors = numpy.asarray(colors, dtype=numpy.float32)
+            if colors.ndim == 2:
+                colors = numpy.repeat(colors, 4, axis=0)
+            self._buffers[target].extend(colors)
 
     def add_triangle(self, p1, p2, p3):
         i = self._buffers[0].index
         self._buffers[0].set_value(p1)
         self._buffers[0].set_value(p2)
         self._buffers[0].set_value(p3)
-        self._indices.set_value(glm.u16vec3(i, i + 1, i + 2))
+        self._indices.set_value(glm.uvec3(i, i + 1, i + 2))
 
     def add_line(self, p1, p2):
         i = self._buffers[0].index
         self._buffers[0].set_value(p1)
         self._buffers[0].set_value(p2)
-        self._indices.set_value(glm.u16vec2(i, i + 1))
+        self._indices.set_value(glm.uvec2(i, i + 1))
 
     def add_point(self, p1):
         i = self._buffers[0].index
         self._buffers[0].set_value(p1)
-        self._indices.set_value(glm.u16vec1(i))
+        self._indices.set_value(glm.uvec1(i))
 
     def set_colors(self, *args: glm.vec4, target=1):
         for c in args:
@@ -54,7 +89,7 @@ class VertexArrayObject:
             self._buffers[target].set_value(c)
 
     def create(self):
-        gl.glBindVertexArray(self._vao)
+        state.bind_vertex_array(self._vao)
 
         for index, vbo in enumerate(self._buffers):
             vbo.bind(index)
@@ -66,18 +101,36 @@ class VertexArrayObject:
         for vbo in self._buffers:
             vbo.reset()
 
+    def delete(self):
+        self._indices.delete()
+        for vbo in self._buffers:
+            vbo.delete()
+        gl.glDeleteVertexArrays(1, [self._vao])
+        state.invalidate()
+
     def draw(self):
         index_count = len(self._indices) * self.primitive_component_count
-        gl.glDrawElements(self._primitive, index_count, gl.GL_UNSIGNED_SHORT, None)
+        gl.glDrawElements(self._primitive, index_count, gl.GL_UNSIGNED_INT, None)
+        counters.draw_calls += 1
+        counters.vertices += len(self._buffers[0])
+        counters.indices += index_count
+
+    def draw_instanced(self, instance_count):
+        index_count = len(self._indices) * self.primitive_component_count
+        gl.glDrawElementsInstanced(self._primitive, index_count, gl.GL_UNSIGNED_INT, None,
+                                   instance_count)
+        counters.draw_calls += 1
+        counters.vertices += len(self._buffers[0]) * instance_count
+        counters.indices += index_count * instance_count
 
     @property
     def index_data_type(self):
         if self._primitive == gl.GL_TRIANGLES:
-            return glm.u16vec3
+            return glm.uvec3
         elif self._primitive == gl.GL_LINES:
-            return glm.u16vec2
+            return glm.uvec2
         elif self._primitive == gl.GL_POINTS:
-            return glm.u16vec1
+            return glm.uvec1
         else:
             raise UserWarning(f'Unknown primitive type {self._primitive}')
 
@@ -93,10 +146,10 @@ class VertexArrayObject:
             raise UserWarning(f'Unknown primitive type {self._primitive}')
 
     def bind(self):
-        gl.glBindVertexArray(self._vao)
+        state.bind_vertex_array(self._vao)
         if self._indices.bind(None):
             if any(vbo.changed for vbo in self._buffers):
                 self.create()
             return True
-        gl.glBindVertexArray(0)
+        state.bind_vertex_array(0)
         return False
@@ -2,16 +2,23 @@ import time
 
 import glfw
 import glm
+import numpy
 from OpenGL.GL import GL_TRUE, glGetString, GL_VERSION, glViewport, glClearColor, \
-    glClear, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT, glEnable, glBlendFunc, \
-    GL_BLEND, GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA
+    glClear, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT, GL_BLEND, GL_SRC_ALPHA, \
+    GL_ONE_MINUS_SRC_ALPHA
 
 import pxng
 import pxng.keys
 import pxng.mouse
+from pxng.gl_state import state, GLState
+from pxng.gpu_timer import timer
+from pxng.render_stats import RenderStats, counters
 from pxng.grid import Grid
-from pxng.colors import WHITE
+from pxng.input_recorder import InputFrame, InputRecorder, InputReplay
+from pxng.colors import WHITE, BLACK, LIGHT_GREY, LIGHT_BLUE, LIGHT_GREEN, LIGHT_ORANGE, \
+    LIGHT_MAGENTA, LIGHT_CYAN
 from pxng.quad import Quad
+from pxng.sprite import SpriteRectangle
 
 
 class Window:
@@ -47,11 +54,54 @@ class Window:
                 Use HDPI if available. Default=False
             color: tuple of float
                 Set the background color. RGB or RGBA supported
+            instanced_rects: bool
+                Draw rectangles as instances of a unit quad with one compact
+                record per rectangle. default=False
+            cache_dir: str
+                Directory for the on-disk caches, like linked shader program
+                binaries. Same as calling *pxng.set_cache_dir*. default=None
+            sdf_text: bool
+                Render text with a signed distance field font that stays
+                sharp when scaled or rotated. default=False
+            text_backend: str
+                'geometry', 'instanced' or 'auto' to pick the instanced
+                backend on software renderers. default='auto'
+            polled_input: bool
+                Query every key and mouse button each frame instead of
+                listening to input events. default=False
+            record_input: str
+                Write the input of every frame to this file. default=None
+            replay_input: str
+                Replace the live input with a log written with
+                *record_input*. The window closes at the end of the log.
+                default=None
+            replay_timestep: float
+                The *elapsed_time* of every replayed frame. Use None to
+                replay the recorded frame times. default=1/60
+            target_fps: float
+                Limit the frame rate. The loop sleeps between frames instead
+                of spinning. default=None (unlimited)
+            timing_frames: int
+                Number of frames kept in *timings*. default=600
+            show_timings: bool
+                Draw the frame time overlay. Its CPU time is not included in
+                *timings*. default=False
+            gpu_timings: bool
+                Measure the GPU time of rects, sprites, text and the grid
+                with timer queries and add it to *timings*. default=False
         """
         if not glfw.init():
             raise UserWarning('Unable to initialize glfw')
+        if 'cache_dir' in kwargs:
+            pxng.set_cache_dir(kwargs['cache_dir'])
         self.fps = 0
         self._handler = None
+        self._fixed_handler = None
+        self._scheduler = pxng.FrameScheduler(kwargs.get('target_fps'))
+        self._timings = pxng.FrameTimings(kwargs.get('timing_frames', 600))
+        self.show_timings = bool(kwargs.get('show_timings', False))
+        self.gpu_timings = bool(kwargs.get('gpu_timings', False))
+        self._stats = RenderStats()
         self._title = title
         self.width = width
         self.height = height
@@ -96,25 +146,51 @@ class Window:
         glfw.make_context_current(self._window)
         glfw.swap_interval(1 if vsync else 0)
 
+        state.invalidate()
+
         gl_version = glGetString(GL_VERSION).decode('utf-8')
         print(f'OpenGL Version string: {gl_version}')
 
         self._spaces = pxng.Spaces(self.width, self.height)
         self._spaces.projection.m = glm.ortho(0, width, height, 0, -1, 1)
         self._spaces.view.scale((self.x_scale, self.y_scale, 1))
+        self._matrix_block = pxng.MatrixBlock()
 
-        self._text_renderer = pxng.TextRenderer(self.create_default_font())
+        sdf_text = bool(kwargs.get('sdf_text', False))
+        text_backend = kwargs.get('text_backend', 'auto')
+        self._text_renderer = pxng.TextRenderer(self.create_default_font(sdf=sdf_text), text_backend)
         self._elapsed_time = 0
         self._current_tint = WHITE
-        self._key_poller = pxng.keys.KeyPoller()
-        self._mouse_poller = pxng.mouse.Mouse(self._window)
-
-        self._quad = Quad()
+        self._polled_input = bool(kwargs.get('polled_input', False))
+        if self._polled_input:
+            self._key_poller = pxng.keys.KeyPoller()
+            self._mouse_poller = pxng.mouse.Mouse(self._window)
+        else:
+            self._key_poller = pxng.keys.KeyListener(self._window)
+            self._mouse_poller = pxng.mouse.MouseListener(self._window)
+
+        self._input_recorder = None
+        self._input_replay = None
+        self._replay_timestep = kwargs.get('replay_timestep', 1 / 60)
+        record_path = kwargs.get('record_input')
+        replay_path = kwargs.get('replay_input')
+        if (record_path or replay_path) and self._polled_input:
+            raise UserWarning('Input recording and replay need event driven input')
+        if replay_path:
+            self._input_replay = InputReplay(replay_path)
+            self._mouse_poller.move_to(*self._input_replay.cursor_pos)
+        elif record_path:
+            self._input_recorder = InputRecorder(record_path, self._mouse_poller.pos)
+
+        self._quad = Quad(instanced=bool(kwargs.get('instanced_rects', False)))
+        self._sprite_batch = pxng.SpriteBatch()
+        self._canvas = None
+        self._canvas_drawn = False
         self._grid = Grid(self.width, self.height)
 
-    def create_default_font(self) -> pxng.Font:
+    def create_default_font(self, sdf=False) -> pxng.Font:
         font_path = pxng.resource('fonts/C64_Pro_Mono-STYLE.ttf')
-        return pxng.Font(font_path, 8)
+        return pxng.Font(font_path, 8, sdf=sdf)
 
     def start_event_loop(self):
         glViewport(0, 0, self.width, self.height)
@@ -134,6 +210,127 @@ class Window:
         """
         return self._mouse_poller
 
+    @property
+    def canvas(self) -> pxng.Canvas:
+        """
+        Returns a pixel canvas covering the window at the virtual resolution.
+
+        The canvas is created on first access. Unless *draw_canvas* is called
+        explicitly it is drawn on top of everything else at the end of every
+        frame.
+
+        Returns
+        -------
+        pxng.Canvas
+        """
+        if self._canvas is None:
+            width = int(round(self.width / self.x_scale))
+            height = int(round(self.height / self.y_scale))
+            self._canvas = pxng.Canvas(width, height)
+        return self._canvas
+
+    @property
+    def text_backend(self) -> str:
+        """The text backend in use, 'geometry' or 'instanced'."""
+        return self._text_renderer.backend
+
+    @property
+    def timings(self) -> pxng.FrameTimings:
+        """
+        CPU time per phase of the recent frames. Use *summary*, *to_csv* or
+        *to_json* for percentiles.
+
+        Returns
+        -------
+        pxng.FrameTimings
+        """
+        return self._timings
+
+    @property
+    def stats(self) -> RenderStats:
+        """
+        What the previous frame submitted to OpenGL: draw calls, vertices,
+        indices, uploaded bytes, texture binds, program switches and batch
+        flushes.
+
+        Returns
+        -------
+        pxng.render_stats.RenderStats
+        """
+        return self._stats
+
+    @property
+    def gpu_timings(self) -> bool:
+        """
+        Measure GPU time per draw category. The results arrive a few frames
+        late in the *timings* columns gpu_quad, gpu_sprite, gpu_text and
+        gpu_grid, so the newest frames show 0 until then.
+        """
+        return timer.enabled
+
+    @gpu_timings.setter
+    def gpu_timings(self, enabled):
+        if enabled:
+            self._timings.add_columns([f'gpu_{name}' for name in timer.categories])
+        timer.enabled = bool(enabled)
+
+    _timing_colors = {
+        'input': LIGHT_MAGENTA,
+        'update': LIGHT_GREEN,
+        'flush': LIGHT_BLUE,
+        'swap': LIGHT_ORANGE,
+        'events': LIGHT_CYAN,
+    }
+
+    def draw_timings(self, x=2, y=2, width=120, height=40):
+        """
+        Draw a frame time graph of the last *width* frames with the time of
+        every phase stacked in its own color, and the frame time percentiles.
+
+        Parameters
+        ----------
+        x: float
+            Left edge in virtual pixels.
+        y: float
+            Top edge in virtual pixels.
+        width: int
+            Width of the graph, one pixel per frame.
+        height: int
+            Height of the graph. The scale adapts to the slowest frame.
+        """
+        timings = self._timings
+        frames = timings.frames()[-width:]
+        count = len(frames)
+        phases = timings.phases
+
+        self.fill_rect(x, y, width, height + 20, (*BLACK, 0.6))
+        if count > 0:
+            # at least 1/30 s high so a steady frame rate does not fill the graph
+            scale = height / max(frames[:, timings.column_index('frame')].max(), 1 / 30)
+            heights = frames[:, :len(phases)] * scale
+            tops = y + 20 + height - numpy.cumsum(heights, axis=1)
+
+            xs = numpy.repeat(x + width - count + numpy.arange(count), len(phases))
+            colors = numpy.tile([self._timing_colors[name] for name in phases], (count, 1))
+            self.fill_rects(xs, tops.ravel(), numpy.ones(xs.shape), heights.ravel(), colors)
+
+        frame = timings.summary()['frame']
+        self.draw_text(x + 1, y + 1, f'{timings.last() * 1000:5.1f} ms', tint=LIGHT_GREY)
+        self.draw_text(x + 1, y + 10, f'p95 {frame["p95"]:.1f} p99 {frame["p99"]:.1f}', tint=LIGHT_GREY)
+
+    @property
+    def gl_state(self) -> GLState:
+        """
+        Returns the GL state cache. Its *issued* and *skipped* counters tell how
+        many binds and uniform uploads were sent to GL and how many were
+        dropped as redundant.
+
+        Returns
+        -------
+        pxng.gl_state.GLState
+        """
+        return state
+
     @property
     def title(self):
         return self._title
@@ -148,89 +345,265 @@ class Window:
         return self._elapsed_time
 
     def _loop(self):
+        scheduler = self._scheduler
         frame_count = 0
-        fps_now = time.time()
-        elapsed_now = time.time()
-        while not glfw.window_should_close(self._window):
+        fps_now = time.perf_counter()
+        scheduler.begin_frame()
+        timings = self._timings
+        try:
+            while not glfw.window_should_close(self._window):
+                self._elapsed_time = scheduler.begin_frame()
+                timings.begin_frame()
+
+                if not self._process_input():
+                    break
+                timings.mark('input')
+
+                steps = scheduler.fixed_steps(self._elapsed_time)
+                if self._fixed_handler is not None:
+                    for _ in range(steps):
+                        self._fixed_handler(self)
+
+                self._spaces.push()
+                self._spaces.tint = WHITE
+                self._matrix_block.update(self._spaces)
+
+                glClearColor(*self._color)
+                glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+                state.enable(GL_BLEND)
+                state.blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+                # draw call
+                if self._handler is not None:
+                    self._handler(self)
+
+                if self._canvas is not None and not self._canvas_drawn:
+                    self.draw_canvas()
+                self._canvas_drawn = False
+                timings.mark('update')
+
+                # render last batch of rects and sprites (if any)
+                self._flush_batches()
+                timings.mark('flush')
+
+                if self.show_timings:
+                    # the overlay is drawn and flushed on its own so it is not measured
+                    self.draw_timings()
+                    self._flush_batches()
+                    timings.skip()
+                self._spaces.pop()
+
+                # Swap front and back buffers
+                glfw.swap_buffers(self._window)
+                timings.mark('swap')
+
+                # Poll for and process events
+                glfw.poll_events()
+                timings.mark('events')
+
+                for frame_number, gpu_times in timer.end_frame(timings.frame_number):
+                    timings.record(frame_number, {f'gpu_{name}': value for name, value in gpu_times.items()})
+                timings.end_frame()
+
+                self._stats = counters.copy()
+                counters.reset()
+
+                frame_count += 1
+                fps_time_delta = (time.perf_counter() - fps_now)
+                self.fps = frame_count / fps_time_delta
+
+                if fps_time_delta >= 1:
+                    title = f'{self.title} @ {self.fps:.0f} FPS'
+                    glfw.set_window_title(self._window, title)
+                    fps_now = time.perf_counter()
+                    frame_count = 0
+
+                scheduler.wait()
+        finally:
+            # also on errors, recordings of crashes are the ones worth replaying
+            if self._input_recorder is not None:
+                self._input_recorder.close()
+            timer.delete()
+            # the shared programs and vertex arrays die with the context
+            pxng.ShaderProgram.clear_registry()
+            SpriteRectangle.clear_shared()
+            glfw.terminate()
+
+    def _process_input(self) -> bool:
+        """Advance the keyboard and mouse state. Returns False at the end of a replay."""
+        if self._polled_input:
             self._key_poller.poll_keys(self._window)
             self._mouse_poller._poll_mouse(self._window)
+            return True
+
+        key_events = self._key_poller.take_events()
+        mouse_input = self._mouse_poller.take_input()
+
+        if self._input_replay is not None:
+            # live input is dropped while replaying
+            frame = self._input_replay.next_frame()
+            if frame is None:
+                self.close_window()
+                return False
+            key_events = frame.key_events
+            mouse_input = frame.mouse_input
+            if self._replay_timestep is not None:
+                self._elapsed_time = self._replay_timestep
+            else:
+                self._elapsed_time = frame.elapsed_time
+        elif self._input_recorder is not None:
+            self._input_recorder.write_frame(InputFrame(self._elapsed_time, key_events, mouse_input))
+
+        self._key_poller.apply_events(key_events)
+        self._mouse_poller.apply_input(mouse_input)
+        return True
 
-            self._spaces.push()
-            self._spaces.tint = WHITE
-
-            glClearColor(*self._color)
-            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-            glEnable(GL_BLEND)
-            glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+    def close_window(self):
+        glfw.set_window_should_close(self._window, glfw.TRUE)
 
-            now = time.time()
-            self._elapsed_time = (now - elapsed_now)
-            elapsed_now = now
+    def set_update_handler(self, handler):
+        self._handler = handler
 
-            # draw call
-            if self._handler is not None:
-                self._handler(self)
+    def set_fixed_update_handler(self, handler, rate=60, max_steps=5):
+        """
+        Run *handler(window)* at a fixed rate, independent of the frame rate.
 
-            # render last batch of rects (if any)
-            self._quad.draw_batch_if_started(self._spaces)
+        The fixed updates of a frame run before the update handler, which
+        then only has to render. It can use *interpolation_alpha* to blend
+        between the last two simulation states.
 
-            # Swap front and back buffers
-            glfw.swap_buffers(self._window)
+        Parameters
+        ----------
+        handler: callable
+            fn(window), called zero or more times per frame. Use None to
+            remove it.
+        rate: float
+            Updates per second. *fixed_timestep* is 1 / rate.
+        max_steps: int
+            Maximum number of updates per frame. When a frame takes longer
+            the remaining time is dropped instead of catching up later.
+        """
+        self._fixed_handler = handler
+        self._scheduler.set_fixed_rate(rate if handler is not None else None, max_steps)
 
-            # Poll for and process events
-            glfw.poll_events()
+    @property
+    def fixed_timestep(self):
+        """Seconds simulated by every fixed update or None without a fixed update handler."""
+        return self._scheduler.fixed_step
 
-            frame_count += 1
-            fps_time_delta = (time.time() - fps_now)
-            self.fps = frame_count / fps_time_delta
+    @property
+    def interpolation_alpha(self) -> float:
+        """Fraction of a fixed timestep that has passed since the last fixed update."""
+        return self._scheduler.alpha
 
-            if fps_time_delta >= 1:
-                title = f'{self.title} @ {self.fps:.0f} FPS'
-                glfw.set_window_title(self._window, title)
-                fps_now = time.time()
-                frame_count = 0
+    @property
+    def target_fps(self):
+        return self._scheduler.target_fps
 
-        glfw.terminate()
+    @target_fps.setter
+    def target_fps(self, target_fps):
+        self._scheduler.target_fps = target_fps
 
-    def close_window(self):
-        glfw.set_window_should_close(self._window, glfw.TRUE)
-
-    def set_update_handler(self, handler):
-        self._handler = handler
+    def _flush_batches(self, keep=None):
+        """Draw all started batches except *keep* to preserve the drawing order."""
+        for batch in (self._quad, self._sprite_batch, self._text_renderer):
+            if batch is not keep:
+                batch.draw_batch_if_started(self._spaces)
 
     def draw_sprite(self, x, y, sprite, scale=1.0, tint=None):
-        self._quad.draw_batch_if_started(self._spaces)
+        self._flush_batches(keep=self._sprite_batch)
         self._spaces.tint = tint
         self._spaces.model.push()
         self._spaces.model.translate((x, y, 0))
         self._spaces.model.scale((scale, scale, 1))
-        sprite.draw(self._spaces)
+        sprite.draw_batched(self._sprite_batch, self._spaces)
         self._spaces.model.pop()
 
+    def draw_canvas(self, tint=WHITE):
+        """Draw the pixel canvas now to place it between other drawing calls."""
+        self.draw_sprite(0, 0, self.canvas, tint=tint)
+        self._canvas_drawn = True
+
+    def create_text(self, text='') -> pxng.Text:
+        """
+        Creates a retained text object for labels that rarely change.
+
+        Pass the returned object to *draw_text* instead of a string. Its
+        glyph buffer is only rebuilt when its *text* property changes.
+
+        Parameters
+        ----------
+        text: str
+            The initial text.
+
+        Returns
+        -------
+        pxng.Text
+        """
+        return pxng.Text(text)
+
     def draw_text(self, x, y, text, scale=1.0, tint=None, angle=0):
-        self._quad.draw_batch_if_started(self._spaces)
         self._spaces.tint = tint
-        self._text_renderer.draw_string(self._spaces, x, y, text, scale, angle)
+        if isinstance(text, pxng.Text):
+            self._flush_batches()
+            self._text_renderer.draw_text(self._spaces, x, y, text, scale, angle)
+        else:
+            self._flush_batches(keep=self._text_renderer)
+            self._text_renderer.check_started()
+            self._text_renderer.add_string(self._spaces, x, y, text, scale, angle)
 
     def draw_partial_sprite(self, x, y, sprite, sx, sy, sw, sh, scale=1.0, tint=None):
-        self._quad.draw_batch_if_started(self._spaces)
+        self._flush_batches(keep=self._sprite_batch)
         self._spaces.tint = tint
         self._spaces.model.push()
         self._spaces.model.translate((x, y, 0))
         self._spaces.model.scale((scale, scale, 1))
-        sprite.draw_partial(self._spaces, sx, sy, sw, sh)
+        sprite.draw_partial_batched(self._sprite_batch, self._spaces, sx, sy, sw, sh)
         self._spaces.model.pop()
 
     def draw_grid(self, size=10, tint=None, dash_size=4, gap_size=4):
-        self._quad.draw_batch_if_started(self._spaces)
+        self._flush_batches()
         self._spaces.tint = tint
         self._grid.draw(self._spaces, size, dash_size, gap_size)
 
     def fill_rect(self, x, y, w, h, tint=None):
+        self._flush_batches(keep=self._quad)
         self._quad.check_started()
         self._spaces.tint = tint
         self._quad.draw(self._spaces, x, y, w, h)
 
+    def fill_rects(self, *args, colors=None):
+        """
+        Fill many rectangles with a single vectorized batch update.
+
+        Accepts either *fill_rects(xs, ys, ws, hs[, colors])* with one array
+        per coordinate or *fill_rects(rects[, colors])* with an (N, 4) array
+        of (x, y, w, h) rows.
+
+        Parameters
+        ----------
+        *args
+            The rectangles, optionally followed by the colors.
+        colors: array_like
+            A single RGB(A) color or an (N, 3) or (N, 4) array of colors.
+            Defaults to the current tint.
+        """
+        if len(args) in (1, 2):
+            rects = numpy.asarray(args[0], dtype=numpy.float32).reshape(-1, 4)
+            xs, ys, ws, hs = rects.T
+        elif len(args) in (4, 5):
+            xs, ys, ws, hs = args[:4]
+        else:
+            raise UserWarning(f'Expected 1, 2, 4 or 5 positional arguments, got {len(args)}')
+
+        if len(args) in (2, 5):
+            colors = args[-1]
+
+        self._flush_batches(keep=self._quad)
+        self._quad.check_started()
+        self._spaces.tint = None
+        self._quad.draw_rects(self._spaces, xs, ys, ws, hs, colors)
+
     @property
     def tint(self):
         return self._spaces.default_tint